@@ -0,0 +1,218 @@
+"""Offline, resumable analysis of a directory of PDFs
+
+Walks a directory for PDFs and runs the same classification, summary and
+key-phrase extraction as the web app, writing one JSON object per
+document to a JSONL file:
+
+    python analyze_directory.py archive/ --out results.jsonl
+    python analyze_directory.py archive/ --out results.jsonl --processes 8 --threads 16
+
+PDFs are parsed on a process pool and upstream calls run on thread pools.
+Every finished document is recorded in a checkpoint file next to the
+output (results.jsonl.checkpoint), so after a crash or Ctrl-C the same
+command resumes where it stopped. Documents that fail because WorqHat is
+unavailable are retried and, if they still fail, left out of the
+checkpoint so the next run picks them up again, as are documents WorqHat
+answered with an error.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_pipeline import Stage, StagePipeline
+
+
+def find_pdfs(root):
+    """Return paths of all PDFs under a directory, relative to it, in a stable order"""
+    paths = []
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith('.pdf') and not filename.startswith('._'):
+                paths.append(os.path.relpath(os.path.join(directory, filename), root))
+    return paths
+
+
+def extract_file(path):
+    """Read and parse one PDF in a worker process
+
+    Returns:
+        dict: The document id, extracted text and count of pages that failed to parse
+    """
+    from pdf_extract import extract_text
+    with open(path, 'rb') as f:
+        pdf_bytes = f.read()
+    # Parallelism comes from the pool running many files at once, so each file is parsed serially
+    text, failed_pages = extract_text(pdf_bytes, workers=1)
+    return {
+        'document_id': hashlib.sha256(pdf_bytes).hexdigest()[:32],
+        'size': len(pdf_bytes),
+        'text': text,
+        'failed_pages': len(failed_pages),
+    }
+
+
+class Checkpoint:
+    """Append-only record of finished documents and the output length after each one
+
+    On resume the output is truncated to the last recorded length, which
+    drops any line written after the last checkpoint entry, so no document
+    appears twice.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.offset = 0
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    self.done.add(entry['path'])
+                    self.offset = entry['offset']
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, path, offset):
+        self._file.write(json.dumps({'path': path, 'offset': offset}) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.add(path)
+        self.offset = offset
+
+    def close(self):
+        self._file.close()
+
+
+def with_retries(func, attempts):
+    """Retry a stage while the upstream is unavailable, waiting as long as it asks"""
+    from worqhat_utils import UpstreamUnavailable
+
+    def run(record):
+        for attempt in range(attempts):
+            try:
+                return func(record)
+            except UpstreamUnavailable as e:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(max(1.0, e.retry_after))
+    return run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Classify, summarize and extract key phrases for a directory of PDFs')
+    parser.add_argument('directory', help='Directory searched recursively for .pdf files')
+    parser.add_argument('--out', required=True, help='JSONL file results are appended to')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: <out>.checkpoint)')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='PDF parsing processes')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Documents in the classify and analyze stages at once (default: WORQHAT_MAX_PARALLEL)')
+    parser.add_argument('--attempts', type=int, default=5, help='Tries per stage while WorqHat is unavailable')
+    parser.add_argument('--limit', type=int, default=None, help='Process at most this many new documents')
+    parser.add_argument('--fresh', action='store_true', help='Ignore an existing checkpoint and start over')
+    args = parser.parse_args(argv)
+
+    from worqhat_utils import (DocumentClassifier, DocumentProcessor, WORQHAT_MAX_PARALLEL, is_error_response,
+                               raise_if_unavailable, run_concurrently)
+
+    checkpoint_path = args.checkpoint or f"{args.out}.checkpoint"
+    if args.fresh:
+        for path in (args.out, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+    checkpoint = Checkpoint(checkpoint_path)
+
+    if checkpoint.done:
+        # Drop output written after the last checkpoint entry; those documents are redone
+        with open(args.out, 'ab') as out:
+            out.truncate(checkpoint.offset)
+    elif os.path.exists(args.out) and os.path.getsize(args.out):
+        checkpoint.close()
+        parser.error(f"{args.out} already has results but {checkpoint_path} records none; "
+                     f"pass --fresh to start over or --checkpoint to point at its checkpoint")
+
+    pending = [path for path in find_pdfs(args.directory) if path not in checkpoint.done]
+    if args.limit is not None:
+        pending = pending[:args.limit]
+    print(f"{len(checkpoint.done)} documents already done, {len(pending)} to process", file=sys.stderr)
+    if not pending:
+        checkpoint.close()
+        return
+
+    threads = args.threads or WORQHAT_MAX_PARALLEL
+    classifier = DocumentClassifier()
+    processor = DocumentProcessor()
+    pool = ProcessPoolExecutor(max_workers=max(1, args.processes))
+
+    def extract(record):
+        record.update(pool.submit(extract_file, os.path.join(args.directory, record['path'])).result())
+        if not record['text'].strip():
+            raise ValueError('No text could be extracted')
+
+    def classify(record):
+        category, confidence, source = classifier.classify_with_confidence(record['text'])
+        record.update({'category': category, 'confidence': confidence, 'classified_by': source})
+
+    def analyze(record):
+        text = record['text']
+        summary_result, phrases_result = run_concurrently([
+            lambda: processor.get_summary(text),
+            lambda: processor.extract_key_phrases(text)
+        ])
+        raise_if_unavailable([summary_result, phrases_result])
+        if not summary_result.ok:
+            raise summary_result.error
+        key_phrases = phrases_result.value if phrases_result.ok else []
+        for value in [summary_result.value] + list(key_phrases or []):
+            if is_error_response(value):
+                # Not checkpointed, so the next run tries the document again
+                raise RuntimeError(value)
+        record['summary'] = summary_result.value
+        record['key_phrases'] = key_phrases
+
+    pipeline = StagePipeline([
+        Stage('extract', extract, args.processes),
+        Stage('classify', with_retries(classify, args.attempts), threads),
+        Stage('analyze', with_retries(analyze, args.attempts), threads),
+    ])
+
+    started = time.perf_counter()
+    written = deferred = 0
+    try:
+        with open(args.out, 'a', encoding='utf-8') as out:
+            records = ({'path': path, 'filename': os.path.basename(path)} for path in pending)
+            for record in pipeline.run(records):
+                record.pop('text', None)
+                if record.get('retry_after') is not None or record.get('failed_stage') in ('classify', 'analyze'):
+                    # WorqHat was unavailable throughout or answered with an error; leave it for the next run
+                    deferred += 1
+                    print(f"Deferred {record['path']}: {record['error']}", file=sys.stderr)
+                    continue
+                record['processed_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+                checkpoint.record(record['path'], out.tell())
+                written += 1
+                if written % 25 == 0:
+                    rate = written / (time.perf_counter() - started)
+                    print(f"{written}/{len(pending)} documents ({rate:.1f}/s)", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume", file=sys.stderr)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        checkpoint.close()
+
+    print(f"Wrote {written} documents to {args.out}"
+          + (f"; {deferred} deferred after WorqHat failures" if deferred else ''), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
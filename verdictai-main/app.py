@@ -1,16 +1,31 @@
-from flask import Flask, request, jsonify, render_template, session, send_file
+from flask import Flask, request, jsonify, render_template, session, send_file, Response, stream_with_context, url_for, g
 
-import PyPDF2
 import os 
 from dotenv import load_dotenv
 from io import BytesIO
-import tempfile
-from docx import Document
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+from werkzeug.datastructures import FileStorage
 import uuid
+import zipfile
+import json
+import threading
+import hashlib
 import datetime
-from multiagent import questioner, tone_analyzer, summarizer
+import math
+import re
+import time
+from multiagent import questioner, tone_analyzer, summarizer, warm_up
+from pdf_extract import extract_text
+from retrieval import build_index
+from conversation_memory import ConversationMemory
+from batch_pipeline import (Stage, StagePipeline, BatchTooLarge, iter_archive_pdfs, BATCH_EXTRACT_WORKERS,
+                            BATCH_CLASSIFY_WORKERS, BATCH_ANALYZE_WORKERS, BATCH_MAX_DOCUMENTS)
+from category_metrics import CATEGORY_METRICS, extract_category_metrics
+from draft_renderer import compile_template
+from jobs import JobQueue, QueueFull, JOB_RESULT_TTL
+import metrics
+from worqhat_utils import UpstreamUnavailable
+from session_store import (StoreBudget, create_store, start_sweeper, SESSION_STORE_MAX_BYTES, SESSION_STORE_SPILL_BYTES,
+                           STATE_BACKEND)
 
 
 load_dotenv()
@@ -19,56 +34,80 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'default-secret-key')
 
-general_context = ""
-doc_chat_context = ""
-
-# Store document text globally (in a real app, you'd use a database or session)
-document_cache = {}
-pdf_cache = {}  # Store PDF files for viewing
-draft_cache = {}  # Store generated drafts
-
-CATEGORY_METRICS = {
-    'Legal Notice': [
-        'Severity Score', 'Violations & Broken Rules', 'Legal Consequences', 'Actionable Steps',
-        'Urgency Detection', 'Tone Analysis', 'Recommended Actions'
-    ],
-    'Ownership Documents': [
-        'Ownership Rights & Obligations', 'Transfer, Leasing, Sale, Mortgaging Clauses',
-        'Financial Liabilities', 'Terms & Conditions', 'Important Dates', 'Document Validity', 'Summary Type'
-    ],
-    'Contracts & Agreements': [
-        'Parties Involved & Roles', 'Terms & Conditions', 'Termination Clauses', 'Penalties for Breach',
-        'Severity Score', 'Obligations & Rights', 'Actionable Steps'
-    ],
-    'Financial Documents': [
-        'Financial Obligations', 'Coverage Details', 'Deadlines & Payment Schedules',
-        'Legal Implications', 'Severity Score', 'Urgency Detection', 'Risk Analysis'
-    ],
-    'Terms & Conditions / Privacy Policies': [
-        'User Rights & Restrictions', 'Data Usage & Privacy Clauses', 'Liability Clauses',
-        'Termination & Suspension Rules', 'Severity Score', 'Personal Implications', 'Suggested Actions'
-    ],
-    'Intellectual Property Documents': [
-        'Ownership & Usage Rights', 'Infringement Clauses', 'Exclusivity & Licensing Terms',
-        'Penalties for Violation', 'Severity Score', 'Urgency Detection', 'Recommended Actions'
-    ],
-    'Criminal Offense Documents': [
-        'Charges Filed', 'Potential Penalties', 'Required Actions', 'Severity Score',
-        'Urgency Detection', 'Tone Analysis', 'Suggested Actions'
-    ],
-    'Regulatory Compliance Documents': [
-        'Compliance Requirements', 'Penalties for Non-Compliance', 'Renewal Deadlines & Conditions',
-        'Guidelines for Rectification', 'Severity Score', 'Urgency Detection', 'Recommended Actions'
-    ],
-    'Employment Documents': [
-        'Terms of Employment', 'Termination Conditions', 'Confidentiality Clauses',
-        'Breach Consequences', 'Severity Score', 'Urgency Detection', 'Suggested Actions'
-    ],
-    'Court Judgments & Legal Precedents': [
-        'Summary of Judgment', 'Legal Basis', 'Potential Consequences',
-        'Severity Score', 'Urgency Detection', 'Recommended Actions'
-    ]
-}
+# Local HuggingFace models load on first use unless MODEL_WARMUP asks for them at startup
+if os.getenv('MODEL_WARMUP', '0') not in ('0', 'false', 'False'):
+    threading.Thread(target=warm_up, name='model-warmup', daemon=True).start()
+
+# Character budgets for document excerpts sent with chat questions and draft requests
+CHAT_CONTEXT_CHARS = int(os.getenv('CHAT_CONTEXT_CHARS', '3000'))
+DRAFT_CONTEXT_CHARS = int(os.getenv('DRAFT_CONTEXT_CHARS', '1500'))
+METRICS_CONTEXT_CHARS = int(os.getenv('METRICS_CONTEXT_CHARS', '6000'))
+
+DOCUMENT_TTL = float(os.getenv('DOCUMENT_TTL', str(2 * 3600)))
+DRAFT_TTL = float(os.getenv('DRAFT_TTL', str(3600)))
+
+
+# Session stores live on the configured state backend. In memory they share one budget, idle entries
+# expire and large PDFs spill to disk; on SQLite they are shared by all worker processes.
+# Values read from a store may be copies, so a changed value must be written back.
+store_budget = StoreBudget(SESSION_STORE_MAX_BYTES)
+document_cache = create_store('documents', ttl=DOCUMENT_TTL, budget=store_budget)  # Extracted text and metadata, keyed by document id
+pdf_cache = create_store('pdfs', ttl=DOCUMENT_TTL, budget=store_budget, spill_bytes=SESSION_STORE_SPILL_BYTES)  # Store PDF files for viewing, keyed by document id
+draft_cache = create_store('drafts', ttl=DRAFT_TTL, budget=store_budget)  # Rendered .docx bytes of generated drafts
+session_documents = create_store('session_documents', ttl=DOCUMENT_TTL, budget=store_budget)  # Most recently uploaded document id for each session
+# Conversation history per session (and per document for document chat)
+doc_chat_memory = create_store('doc_chat_memory', ttl=DOCUMENT_TTL, budget=store_budget)
+general_chat_memory = create_store('general_chat_memory', ttl=DOCUMENT_TTL, budget=store_budget)
+# Long-running analysis and drafting run here so request threads return immediately; with a shared
+# backend their status is published so any worker can answer /jobs/<job_id>
+job_queue = JobQueue(store=create_store('jobs', ttl=JOB_RESULT_TTL) if STATE_BACKEND != 'memory' else None)
+start_sweeper([document_cache, pdf_cache, draft_cache, session_documents, doc_chat_memory, general_chat_memory, job_queue])
+metrics.register_store_gauges([document_cache, pdf_cache, draft_cache, session_documents, doc_chat_memory,
+                               general_chat_memory])
+
+
+@app.errorhandler(UpstreamUnavailable)
+def upstream_unavailable(error):
+    """Answer 503 with Retry-After while WorqHat is overloaded or failing"""
+    retry_after = max(1, math.ceil(error.retry_after))
+    app.logger.warning(f"Upstream unavailable: {error}")
+    return jsonify({'error': str(error), 'retry_after': retry_after}), 503, {'Retry-After': str(retry_after)}
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_duration(response):
+    """Observe the request duration per route; for streamed responses this is the time to the first byte"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.http_request_duration.observe(time.perf_counter() - started, method=request.method,
+                                              route=route, status=response.status_code)
+    return response
+
+
+def load_memory(store, key):
+    """Fetch the conversation memory for a key, starting a new one if there is none"""
+    memory = store.get(key)
+    return memory if memory is not None else ConversationMemory()
+
+
+def save_turn(store, key, user_message, bot_response, speaker='Bot'):
+    """Append an exchange to a conversation and write it back so its size is re-accounted"""
+    memory = load_memory(store, key)
+    memory.add_turn(user_message, bot_response, speaker)
+    store[key] = memory
+
+
+# Heading that separates a detailed analysis from its reasoning points, in the prompt and when parsing
+REASONING_HEADING = 'Reasoning points:'
+_REASONING_LINE = re.compile(r'^[ \t>#*_]*reasoning points[ \t*_]*:?[ \t*_]*$', re.IGNORECASE | re.MULTILINE)
+_REASONING_HOLD_CHARS = 40
+
 
 # Document templates for different draft types
 DRAFT_TEMPLATES = {
@@ -129,11 +168,14 @@ CATEGORY_TO_TEMPLATE = {
     'default': 'General Letter'
 }
 
+# Compile every template's styles and line classifier once, up front
+for _template in DRAFT_TEMPLATES.values():
+    compile_template(_template)
+
 @app.route('/')
 def index():
     # Generate a unique session ID if not exists
-    if 'session_id' not in session:
-        session['session_id'] = os.urandom(16).hex()
+    get_session_id()
     return render_template('index.html')
 
 @app.route('/general_chat.html')
@@ -142,90 +184,383 @@ def general_chat():
 
 def extract_text_from_pdf(pdf_file):
     try:
-        # Create a BytesIO object to avoid file seeking issues
-        pdf_content = BytesIO(pdf_file.read())
+        pdf_content = pdf_file.read()
         # Reset the file pointer for future operations
         pdf_file.seek(0)
-        
-        reader = PyPDF2.PdfReader(pdf_content)
-        text = ''
-        for page_num in range(len(reader.pages)):
-            text += reader.pages[page_num].extract_text()
+
+        # Pages are extracted in parallel; a failing page is skipped rather than failing the document
+        with metrics.timed('pdf_extraction'):
+            text, failed_pages = extract_text(pdf_content)
+        for page in failed_pages:
+            app.logger.warning(f"PDF extraction error on page {page.index + 1}: {page.error}")
         return text
     except Exception as e:
         app.logger.error(f"PDF extraction error: {str(e)}")
-        return str(e)
+        return ''
 
 
-@app.route('/classify', methods=['POST'])
-def classify_document():
-    if 'document' not in request.files:
-        return jsonify({'error': 'No PDF file uploaded'}), 400
+def get_session_id():
+    """Return the current session id, creating one if the session has none yet"""
+    if 'session_id' not in session:
+        session['session_id'] = os.urandom(16).hex()
+    return session['session_id']
 
-    pdf_file = request.files['document']
 
-    # Save the PDF file in memory for later viewing
-    session_id = session.get('session_id', os.urandom(16).hex())
-    pdf_content = pdf_file.read()
-    pdf_cache[session_id] = pdf_content
+def register_document(pdf_file, remember=True):
+    """Store an uploaded PDF and its extracted text in the document registry
+
+    Documents are keyed by a hash of their content, so uploading the same
+    PDF again reuses the text extracted the first time.
+
+    Args:
+        pdf_file: The uploaded file object
+        remember (bool): Make this the session's current document; needs a request context
 
-    # Reset file pointer
+    Returns:
+        tuple: The document id and its registry record, or (None, None) if no text could be extracted
+    """
+    pdf_content = pdf_file.read()
     pdf_file.seek(0)
+    document_id = hashlib.sha256(pdf_content).hexdigest()[:32]
+
+    record = document_cache.get(document_id)
+    if record is None:
+        document_text = extract_text_from_pdf(pdf_file)
+        if not document_text:
+            return None, None
+        record = {
+            'text': document_text,
+            'filename': pdf_file.filename,
+            'size': len(pdf_content),
+            'uploaded_at': datetime.datetime.now().isoformat(),
+            'category': None,
+            # Chunk index used to pick the passages relevant to each question
+            'index': build_index(document_text, CHAT_CONTEXT_CHARS)
+        }
+        document_cache[document_id] = record
 
-    document_text = extract_text_from_pdf(pdf_file)
+    # Save the PDF file in memory for later viewing
+    pdf_cache[document_id] = pdf_content
+    if remember:
+        session_documents[get_session_id()] = document_id
+    return document_id, record
+
+
+def relevant_context(record, query, max_chars=None):
+    """Select the parts of a document most relevant to a query, within a character budget"""
+    max_chars = max_chars or CHAT_CONTEXT_CHARS
+    index = record.get('index')
+    if index is None:
+        return record['text'][:max_chars]
+    return index.context_for(query, max_chars)
+
+
+def resolve_document(document_id=None):
+    """Look up a registered document by id, defaulting to the session's latest upload
+
+    Returns:
+        tuple: The document id and its registry record, or (None, None) if not found
+    """
+    document_id = document_id or session_documents.get(session.get('session_id'))
+    record = document_cache.get(document_id) if document_id else None
+    if record is None:
+        return None, None
+    return document_id, record
+
+
+def document_from_request():
+    """Resolve the document for an analysis request from an uploaded file or a document id"""
+    if 'document' in request.files:
+        return register_document(request.files['document'])
+    data = request.get_json(silent=True) or {}
+    document_id, record = resolve_document(request.form.get('document_id') or data.get('document_id'))
+    if record is not None:
+        session_documents[get_session_id()] = document_id
+    return document_id, record
+
+
+@app.route('/upload', methods=['POST'])
+def upload_document():
+    """Upload and parse a PDF once, returning an id the analysis endpoints accept"""
+    if 'document' not in request.files:
+        return jsonify({'error': 'No PDF file uploaded'}), 400
 
-    if not document_text:
+    document_id, record = register_document(request.files['document'])
+    if record is None:
         return jsonify({'error': 'Failed to extract text from PDF'}), 400
 
-    document_cache[session_id] = document_text
+    return jsonify({
+        'document_id': document_id,
+        'filename': record['filename'],
+        'size': record['size'],
+        'characters': len(record['text'])
+    })
+
+
+@app.route('/classify', methods=['POST'])
+def classify_document():
+    if 'document' not in request.files and not request.form.get('document_id'):
+        return jsonify({'error': 'No PDF file uploaded'}), 400
+
+    document_id, record = document_from_request()
+
+    if record is None:
+        return jsonify({'error': 'Failed to extract text from PDF'}), 400
 
     try:
         # Use WorqHat-based classifier
         from worqhat_utils import DocumentClassifier
         document_classifier = DocumentClassifier()
-        category = document_classifier.classify(document_text)
-        return jsonify({'category': category})
+        category, confidence, source = document_classifier.classify_with_confidence(record['text'])
+        record['category'] = category
+        document_cache[document_id] = record
+        return jsonify({
+            'category': category,
+            'document_id': document_id,
+            'confidence': confidence,
+            'classified_by': source
+        })
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         app.logger.error(f"Classification error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+
+def wants_async(data=None):
+    """Whether the client asked for the work to run as a background job"""
+    flag = request.args.get('async') or request.form.get('async') or (data or {}).get('async')
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+
+def submit_job(kind, func, steps=1):
+    """Queue func(job) on the background job queue and answer with the job's status URL"""
+    try:
+        job = job_queue.submit(kind, func, steps)
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    status_url = url_for('job_status', job_id=job.id)
+    return jsonify({'job_id': job.id, 'status': job.status, 'status_url': status_url}), 202, {'Location': status_url}
+
+
+def analyze_document(document_id, document_text, job=None):
+    """Summarize a document and extract its key phrases
+
+    Args:
+        document_id (str): The registered document id
+        document_text (str): The extracted document text
+        job (Job): The background job to report partial results to, if any
+
+    Returns:
+        dict: The /process response body
+    """
+    # Use WorqHat-based document processor; summary and key phrases are independent
+    from worqhat_utils import DocumentProcessor, raise_if_unavailable, run_concurrently
+    document_processor = DocumentProcessor()
+    report = job.report if job else (lambda key, value: value)
+    if job:
+        job.update(stage='Summarizing document and extracting key phrases')
+    summary_result, phrases_result = run_concurrently([
+        lambda: report('summary', document_processor.get_summary(document_text)),
+        lambda: report('key_phrases', document_processor.extract_key_phrases(document_text))
+    ])
+    raise_if_unavailable([summary_result, phrases_result])
+    summary = summary_result.value if summary_result.ok else f"Error generating summary: {summary_result.error}"
+    key_phrases = phrases_result.value if phrases_result.ok else [f"Error: {phrases_result.error}"]
+
+    return {
+        'document_id': document_id,
+        'summary': summary,
+        'key_phrases': key_phrases,
+        'document_text': document_text[:200] + '...' if len(document_text) > 200 else document_text
+    }
+
+
 @app.route('/process', methods=['POST'])
 def process_document():
-    if 'document' not in request.files or 'category' not in request.form:
+    if ('document' not in request.files and not request.form.get('document_id')) or 'category' not in request.form:
         return jsonify({'error': 'Document file or category is missing'}), 400
 
-    pdf_file = request.files['document']
     category = request.form['category']
-    document_text = extract_text_from_pdf(pdf_file)
+    document_id, record = document_from_request()
+    document_text = record['text'] if record else ''
 
     if not document_text or not category:
         return jsonify({'error': 'Document text or category is missing'}), 400
 
-    session_id = session.get('session_id', os.urandom(16).hex())
-    document_cache[session_id] = document_text
+    if wants_async():
+        return submit_job('process', lambda job: analyze_document(document_id, document_text, job), steps=2)
 
     try:
-        # Use WorqHat-based document processor
-        from worqhat_utils import DocumentProcessor
-        document_processor = DocumentProcessor()
-        summary = document_processor.get_summary(document_text)
-        key_phrases = document_processor.extract_key_phrases(document_text)
-
-        return jsonify({
-            'summary': summary,
-            'key_phrases': key_phrases,
-            'document_text': document_text[:200] + '...' if len(document_text) > 200 else document_text
-        })
+        return jsonify(analyze_document(document_id, document_text))
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         app.logger.error(f"Processing error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+def category_metrics_report(document_id, record, category, refresh=False, job=None):
+    """Return the metrics report of a document for a category, computing only what is not cached
+
+    Reports are kept on the document's registry record per category. A
+    report with missing metrics is completed on the next request rather
+    than recomputed.
+    """
+    reports = record.get('metrics') or {}
+    cached = None if refresh else reports.get(category)
+    if cached is not None and not cached['missing']:
+        return dict(cached, document_id=document_id, cached=True)
+
+    if job:
+        job.update(stage=f"Assessing {category} metrics")
+    document_context = relevant_context(record, ' '.join(CATEGORY_METRICS[category]), METRICS_CONTEXT_CHARS)
+    report = extract_category_metrics(category, document_context, previous=cached)
+    record['metrics'] = dict(reports, **{category: report})
+    document_cache[document_id] = record
+    return dict(report, document_id=document_id, cached=False)
+
+
+@app.route('/category-metrics', methods=['POST'])
+def category_metrics():
+    """Compute every metric defined for a document's category in one structured WorqHat call
+
+    Takes an uploaded `document` or a `document_id`, and an optional
+    `category` (defaulting to the document's classification). Set
+    `refresh` to ignore a cached report.
+    """
+    data = request.get_json(silent=True) or {}
+    document_id, record = document_from_request()
+    if record is None:
+        return jsonify({'error': 'No document found. Please upload a document first.'}), 400
+
+    refresh = str(request.form.get('refresh') or data.get('refresh') or '').lower() in ('1', 'true', 'yes')
+    category = request.form.get('category') or data.get('category') or record.get('category')
+    if category is not None and category not in CATEGORY_METRICS:
+        return jsonify({'error': f"Unknown category: {category}", 'categories': list(CATEGORY_METRICS)}), 400
+
+    def report(job=None):
+        document_category = category
+        if document_category is None:
+            from worqhat_utils import DocumentClassifier
+            document_category = DocumentClassifier().classify(record['text'])
+            record['category'] = document_category
+            document_cache[document_id] = record
+        return category_metrics_report(document_id, record, document_category, refresh, job)
+
+    if wants_async(data):
+        return submit_job('category_metrics', report)
+
+    try:
+        return jsonify(report())
+    except UpstreamUnavailable:
+        raise
+    except Exception as e:
+        app.logger.error(f"Category metrics error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+def batch_inputs():
+    """Collect (filename, bytes) pairs from the uploaded PDFs and zip archives of a batch request"""
+    inputs = []
+    for upload in request.files.getlist('documents') + request.files.getlist('archive'):
+        if upload.filename.lower().endswith('.zip') or zipfile.is_zipfile(upload.stream):
+            upload.stream.seek(0)
+            inputs.extend(iter_archive_pdfs(upload.stream, BATCH_MAX_DOCUMENTS - len(inputs)))
+        else:
+            upload.stream.seek(0)
+            inputs.append((upload.filename, upload.read()))
+        if len(inputs) > BATCH_MAX_DOCUMENTS:
+            raise BatchTooLarge(f"A batch may hold at most {BATCH_MAX_DOCUMENTS} documents")
+    return inputs
+
+
+def stage_workers(name, configured):
+    """Workers for a batch stage: the request may lower the configured limit but not raise it"""
+    try:
+        return max(1, min(int(request.form.get(name, configured)), configured))
+    except ValueError:
+        return configured
+
+
+@app.route('/batch', methods=['POST'])
+def batch_process():
+    """Classify and analyze many PDFs, streaming one NDJSON line per document as it finishes
+
+    Accepts PDFs under `documents` (repeatable) and/or zip archives under
+    `archive`. Each document is extracted, classified, summarized and its
+    key phrases extracted, with separate concurrency limits per stage that
+    can be lowered per request with `extract_workers`, `classify_workers`
+    and `analyze_workers`. Results arrive in completion order; each carries
+    its `index` in the upload order and a `document_id` usable with /chat.
+    A final line reports totals.
+    """
+    try:
+        inputs = batch_inputs()
+    except BatchTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'Archive is not a valid zip file'}), 400
+    if not inputs:
+        return jsonify({'error': 'No PDF files uploaded'}), 400
+
+    from worqhat_utils import DocumentClassifier
+    classifier = DocumentClassifier()
+
+    def extract(record):
+        pdf_file = FileStorage(BytesIO(record.pop('content')), filename=record['filename'])
+        document_id, document = register_document(pdf_file, remember=False)
+        if document is None:
+            raise ValueError('Failed to extract text from PDF')
+        record['document_id'] = document_id
+        record['_text'] = document['text']
+
+    def classify(record):
+        category, confidence, source = classifier.classify_with_confidence(record['_text'])
+        document = document_cache.get(record['document_id'])
+        if document is not None:
+            document['category'] = category
+            document_cache[record['document_id']] = document
+        record.update({'category': category, 'confidence': confidence, 'classified_by': source})
+
+    def analyze(record):
+        result = analyze_document(record['document_id'], record.pop('_text'))
+        record.update({'summary': result['summary'], 'key_phrases': result['key_phrases']})
+
+    pipeline = StagePipeline([
+        Stage('extract', extract, stage_workers('extract_workers', BATCH_EXTRACT_WORKERS)),
+        Stage('classify', classify, stage_workers('classify_workers', BATCH_CLASSIFY_WORKERS)),
+        Stage('analyze', analyze, stage_workers('analyze_workers', BATCH_ANALYZE_WORKERS)),
+    ])
+    records = [{'index': index, 'filename': filename, 'content': content}
+               for index, (filename, content) in enumerate(inputs)]
+
+    def lines():
+        started = time.perf_counter()
+        failed = 0
+        for record in pipeline.run(records):
+            record.pop('_text', None)
+            record.pop('content', None)
+            failed += 'error' in record
+            yield json.dumps(record) + '\n'
+        yield json.dumps({'done': True, 'documents': len(records), 'failed': failed,
+                          'elapsed': round(time.perf_counter() - started, 3)}) + '\n'
+
+    return Response(lines(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report a background job's status, progress and partial or final result"""
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(status)
 
 
 @app.route('/chat', methods=['POST'])
 def chat():
-    global doc_chat_context
     data = request.json
     user_message = data.get('message')
     category = data.get('category')
@@ -236,56 +571,136 @@ def chat():
     if not user_message:
         return jsonify({'error': 'Message is required'}), 400
 
-    session_id = session.get('session_id')
-    document_text = document_cache.get(session_id, '')
+    document_id, record = resolve_document(data.get('document_id'))
+    document_text = record['text'] if record else ''
 
     if not document_text:
         return jsonify({'error': 'No document found. Please process a document first.'}), 400
 
+    memory_key = f"{get_session_id()}:{document_id}"
+
     try:
-        # Use up to 3000 characters of document context
-        document_context = document_text[:3000]
+        if generate_draft:
+            # Send the passages relevant to the draft request rather than the document's opening
+            document_context = relevant_context(record, f"{user_message}\n{draft_instructions}", DRAFT_CONTEXT_CHARS)
+
+            def draft(job=None):
+                if job:
+                    job.update(stage='Drafting document')
+                draft_id = generate_document_draft(user_message, draft_instructions, category, document_context)
+                return {
+                    'response': "I've prepared a draft document based on your instructions. You can download it using the link below.",
+                    'draft_id': draft_id
+                }
+
+            if wants_async(data):
+                return submit_job('draft', draft)
+            return jsonify(draft())
+
+        # Send only the passages relevant to the question
+        document_context = relevant_context(record, user_message)
+        history = load_memory(doc_chat_memory, memory_key).render()
+        system_prompt = build_chat_prompt(category, document_context, detailed_analysis, history)
+
+        # Use WorqHat API for better document analysis
+        from worqhat_utils import respond_to_query
+        bot_response = respond_to_query(user_message, context=system_prompt)
+
+        save_turn(doc_chat_memory, memory_key, user_message, bot_response)
 
-        # Build the prompt
-        system_prompt = f"""You are a legal assistant specializing in {category} documents.
+        return jsonify({'response': bot_response})
+
+    except UpstreamUnavailable:
+        raise
+    except Exception as e:
+        app.logger.error(f"Chat error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+def build_chat_prompt(category, document_context, detailed_analysis, history):
+    """Build the system prompt for a question about the uploaded document"""
+    system_prompt = f"""You are a legal assistant specializing in {category} documents.
 You will answer only questions related to the document and not external questions.
-Document text (truncated if needed):
+Relevant excerpts from the document:
 {document_context}
 
 Previous chat:
-{doc_chat_context}
+{history}
 """
 
-        if detailed_analysis:
-            system_prompt += "Provide a detailed analysis with legal references and thorough explanations.\n"
-        else:
-            system_prompt += "Provide concise, clear answers focused on key legal points.\n"
+    if detailed_analysis:
+        system_prompt += "Provide a detailed analysis with legal references and thorough explanations.\n"
+    else:
+        system_prompt += "Provide concise, clear answers focused on key legal points.\n"
 
-        if generate_draft:
-            draft_id = generate_document_draft(user_message, draft_instructions, category, document_context)
-            return jsonify({
-                'response': "I've prepared a draft document based on your instructions. You can download it using the link below.",
-                'draft_id': draft_id
-            })
+    system_prompt += "If you cannot find the answer in the document, clearly say so. Use **bold** for important points."
+    return system_prompt
 
-        system_prompt += "If you cannot find the answer in the document, clearly say so. Use **bold** for important points."
 
-        # Use WorqHat API for better document analysis
-        from worqhat_utils import respond_to_query
-        bot_response = respond_to_query(user_message, context=system_prompt)
+def sse_event(data, event=None):
+    """Format one Server-Sent Events message carrying a JSON payload"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
 
-        doc_chat_context += f"\nUser: {user_message}\nBot: {bot_response}\n"
 
-        return jsonify({'response': bot_response})
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
-    except Exception as e:
-        app.logger.error(f"Chat error: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming variant of /chat that pushes tokens to the page as Server-Sent Events
+
+    Emits `data: {"token": ...}` messages followed by a final `done` event
+    carrying the full response. The full answer is appended to the chat
+    history once the stream completes.
+    """
+    data = request.json
+    user_message = data.get('message')
+    category = data.get('category')
+    detailed_analysis = data.get('detailed_analysis', False)
+
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+
+    document_id, record = resolve_document(data.get('document_id'))
+    document_text = record['text'] if record else ''
+
+    if not document_text:
+        return jsonify({'error': 'No document found. Please process a document first.'}), 400
+
+    memory_key = f"{get_session_id()}:{document_id}"
+    history = load_memory(doc_chat_memory, memory_key).render()
+    system_prompt = build_chat_prompt(category, relevant_context(record, user_message), detailed_analysis, history)
+
+    # Once the stream has started the status can no longer change, so fail fast with a 503 up front
+    from worqhat_utils import worqhat_client
+    worqhat_client.admission.check()
+
+    def events():
+        chunks = []
+        try:
+            for chunk in worqhat_client.generate_text_stream(user_message, context=system_prompt):
+                chunks.append(chunk)
+                yield sse_event({'token': chunk})
+        except Exception as e:
+            app.logger.error(f"Chat stream error: {str(e)}")
+            yield sse_event({'error': str(e)}, event='error')
+            return
+
+        bot_response = ''.join(chunks)
+        save_turn(doc_chat_memory, memory_key, user_message, bot_response)
+        yield sse_event({'response': bot_response}, event='done')
+
+    return sse_response(events())
 
 
 @app.route('/general_chat', methods=['POST'])
 def general_chat_api():
-    global general_context
     data = request.json
     user_message = data.get('message')
     detailed_analysis = data.get('detailed_analysis', False)
@@ -293,35 +708,154 @@ def general_chat_api():
     if not user_message:
         return jsonify({'error': 'Message is required'}), 400
 
+    session_id = get_session_id()
+    history = load_memory(general_chat_memory, session_id).render()
+
     try:
+        from worqhat_utils import respond_to_query
         if detailed_analysis:
-            # Use WorqHat API for detailed analysis
-            response = respond_to_query(f"Provide a detailed legal analysis with reasoning for this question: {user_message}", context=general_context)
-            # For reasoning, we'll extract key points from the response
-            reasoning_prompt = f"Extract 3-5 key legal reasoning points from this response as a list: {response}"
-            reasoning = respond_to_query(reasoning_prompt).split('\n')
-            general_context += f"\nUser: {user_message}\nSenior Lawyer: {response}\n"
+            # The analysis and its reasoning points come back together from one call
+            analysis = respond_to_query(detailed_analysis_prompt(user_message), context=history)
+            response, reasoning = split_reasoning(analysis)
+            save_turn(general_chat_memory, session_id, user_message, response, 'Senior Lawyer')
             return jsonify({'response': response, 'reasoning': reasoning})
         else:
-            system_prompt = f"""
+            # Use WorqHat API for general legal chat
+            bot_response = respond_to_query(user_message, context=build_general_prompt(history))
+            save_turn(general_chat_memory, session_id, user_message, bot_response)
+            return jsonify({'response': bot_response, 'reasoning': []})
+
+    except UpstreamUnavailable:
+        raise
+    except Exception as e:
+        app.logger.error(f"General chat error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+def build_general_prompt(history):
+    """Build the system prompt for a general legal question"""
+    return f"""
 You are a knowledgeable legal assistant who can provide general information about legal topics.
 You are not a lawyer and should clarify that your responses do not constitute legal advice.
 Recommend consulting a qualified attorney for specific legal situations.
 Use **bold** for important points and be clear and organized.
 
 Context:
-{general_context}
+{history}
 """
 
-            # Use WorqHat API for general legal chat
-            from worqhat_utils import respond_to_query
-            bot_response = respond_to_query(user_message, context=system_prompt)
-            general_context += f"\nUser: {user_message}\nBot: {bot_response}\n"
-            return jsonify({'response': bot_response, 'reasoning': []})
 
-    except Exception as e:
-        app.logger.error(f"General chat error: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+def detailed_analysis_prompt(user_message):
+    return f"""Provide a detailed legal analysis with reasoning for this question: {user_message}
+
+After the analysis, add a line reading exactly "{REASONING_HEADING}" followed by the 3-5 key legal reasoning points \
+that apply, one per line, each starting with "- "."""
+
+
+def _reasoning_items(lines):
+    items = (re.sub(r'^\s*(?:[-*\u2022]|\d+[.)])\s*', '', str(line)).strip() for line in lines)
+    return [item for item in items if item]
+
+
+def split_reasoning(text):
+    """Separate a detailed analysis from the reasoning points that follow it
+
+    Accepts the requested "Reasoning points:" section, also when the model
+    dresses the heading up in markdown, and a JSON object with `answer` and
+    `reasoning` keys. If neither is found the whole text is the answer.
+
+    Returns:
+        tuple: The analysis text and a list of reasoning points
+    """
+    from worqhat_utils import parse_json_object
+    if text.lstrip().startswith(('{', '```')):
+        data = parse_json_object(text)
+        if data is not None and isinstance(data.get('answer'), str):
+            reasoning = data.get('reasoning') or []
+            if isinstance(reasoning, str):
+                reasoning = reasoning.splitlines()
+            return data['answer'].strip(), _reasoning_items(reasoning)
+
+    match = _REASONING_LINE.search(text)
+    if match is None:
+        return text.strip(), []
+    return text[:match.start()].rstrip(), _reasoning_items(text[match.end():].splitlines())
+
+
+def answer_tokens(chunks):
+    """Pass streamed chunks through until the reasoning heading, holding back a line that may become it"""
+    text = ''
+    emitted = 0
+    found = False
+    for chunk in chunks:
+        if found:
+            continue
+        text += chunk
+        match = _REASONING_LINE.search(text, emitted)
+        if match is not None:
+            found = True
+            end = match.start()
+        else:
+            # A line already longer than any heading cannot turn into one, so it is safe to send
+            line_start = text.rfind('\n') + 1
+            end = len(text) if len(text) - line_start > _REASONING_HOLD_CHARS else line_start
+        if end > emitted:
+            yield text[emitted:end]
+            emitted = end
+    if not found and emitted < len(text):
+        # The stream ended without a heading, so the held-back line is part of the answer
+        yield text[emitted:]
+
+
+@app.route('/general_chat/stream', methods=['POST'])
+def general_chat_stream():
+    """Streaming variant of /general_chat that pushes tokens to the page as Server-Sent Events
+
+    With detailed analysis, the reasoning points come at the end of the
+    same answer; they are held back from the token stream and sent with
+    the final `done` event.
+    """
+    data = request.json
+    user_message = data.get('message')
+    detailed_analysis = data.get('detailed_analysis', False)
+
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+
+    session_id = get_session_id()
+    history = load_memory(general_chat_memory, session_id).render()
+
+    from worqhat_utils import worqhat_client
+    worqhat_client.admission.check()
+    if detailed_analysis:
+        prompt, context, speaker = detailed_analysis_prompt(user_message), history, 'Senior Lawyer'
+    else:
+        prompt, context, speaker = user_message, build_general_prompt(history), 'Bot'
+
+    def events():
+        chunks = []
+
+        def recorded():
+            for chunk in worqhat_client.generate_text_stream(prompt, context=context):
+                chunks.append(chunk)
+                yield chunk
+
+        try:
+            for token in (answer_tokens(recorded()) if detailed_analysis else recorded()):
+                yield sse_event({'token': token})
+        except Exception as e:
+            app.logger.error(f"General chat stream error: {str(e)}")
+            yield sse_event({'error': str(e)}, event='error')
+            return
+
+        if detailed_analysis:
+            bot_response, reasoning = split_reasoning(''.join(chunks))
+        else:
+            bot_response, reasoning = ''.join(chunks), []
+        save_turn(general_chat_memory, session_id, user_message, bot_response, speaker)
+        yield sse_event({'response': bot_response, 'reasoning': reasoning}, event='done')
+
+    return sse_response(events())
 
 def generate_document_draft(message, instructions, category, document_context):
     template_name = CATEGORY_TO_TEMPLATE.get(category, CATEGORY_TO_TEMPLATE['default'])
@@ -332,7 +866,7 @@ def generate_document_draft(message, instructions, category, document_context):
 Instructions: {instructions}
 
 This is related to a {category} document. Here's the relevant context from the document:
-{document_context[:1500]}
+{document_context[:DRAFT_CONTEXT_CHARS]}
 
 Your draft should be well-structured and professionally formatted. Include:
 1. A clear header/title
@@ -350,13 +884,9 @@ Do not include explanatory notes. Just return the document content.
         from worqhat_utils import respond_to_query
         draft_content = respond_to_query(message, context=prompt)
 
-        doc = create_formatted_document(draft_content, template)
         draft_id = str(uuid.uuid4())
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.docx')
-        doc.save(temp_file.name)
-
         draft_cache[draft_id] = {
-            'path': temp_file.name,
+            'content': render_draft(draft_content, template),
             'filename': f"Legal_Draft_{datetime.datetime.now().strftime('%Y%m%d')}.docx"
         }
 
@@ -393,17 +923,10 @@ Format the content as if it were going to be printed on letterhead. Do not inclu
         from worqhat_utils import worqhat_client
         draft_content = worqhat_client.generate_text(message, context=prompt)
 
-        # Create a formatted Word document
-        doc = create_formatted_document(draft_content, template)
-
-        # Save the document to a temporary file
+        # Render the formatted Word document in memory and keep it in the draft cache
         draft_id = str(uuid.uuid4())
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.docx')
-        doc.save(temp_file.name)
-
-        # Store the file path in the draft cache
         draft_cache[draft_id] = {
-            'path': temp_file.name,
+            'content': render_draft(draft_content, template),
             'filename': f"Legal_Draft_{datetime.datetime.now().strftime('%Y%m%d')}.docx"
         }
 
@@ -416,83 +939,26 @@ Format the content as if it were going to be printed on letterhead. Do not inclu
 
 def create_formatted_document(content, template):
     """Create a properly formatted Word document based on the template and content"""
-    
-    doc = Document()
-    
-    # Set document margins
-    sections = doc.sections
-    for section in sections:
-        section.top_margin = Inches(template['margins']['top'])
-        section.bottom_margin = Inches(template['margins']['bottom'])
-        section.left_margin = Inches(template['margins']['left'])
-        section.right_margin = Inches(template['margins']['right'])
-    
-    # Split content into lines
-    lines = content.split('\n')
-    
-    # Process each line and apply appropriate formatting
-    current_section = 'header'
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            # Add empty paragraph for spacing
-            doc.add_paragraph()
-            continue
-        
-        # Determine the section based on content
-        if current_section == 'header' and template['includes_date'] and any(month in line.lower() for month in ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october', 'november', 'december']) and any(str(day) in line for day in range(1, 32)):
-            current_section = 'date'
-        elif current_section in ['header', 'date'] and any(salutation in line.lower() for salutation in ['dear', 'to whom', 'attention', 'attn', 're:', 'subject:']):
-            current_section = 'salutation'
-        elif current_section in ['header', 'date', 'salutation'] and any(closing in line.lower() for closing in ['sincerely', 'regards', 'truly', 'thank you', 'best', 'respectfully']):
-            current_section = 'signature'
-        elif current_section in ['header', 'date', 'salutation'] and len(line) > 20:
-            current_section = 'body'
-        
-        # Apply formatting based on the section
-        p = doc.add_paragraph()
-        
-        if current_section == 'header':
-            p.alignment = WD_ALIGN_PARAGRAPH.CENTER if template['header_format']['align'] == 'center' else WD_ALIGN_PARAGRAPH.LEFT
-            run = p.add_run(line)
-            run.font.name = template['header_format']['font']
-            run.font.size = Pt(template['header_format']['size'])
-            run.font.bold = template['header_format']['bold']
-        
-        elif current_section == 'date':
-            p.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            run = p.add_run(line)
-            run.font.name = template['body_format']['font']
-            run.font.size = Pt(template['body_format']['size'])
-        
-        elif current_section == 'body':
-            p.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            run = p.add_run(line)
-            run.font.name = template['body_format']['font']
-            run.font.size = Pt(template['body_format']['size'])
-        
-        elif current_section == 'signature':
-            p.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            run = p.add_run(line)
-            run.font.name = template['signature_format']['font']
-            run.font.size = Pt(template['signature_format']['size'])
-    
-    return doc
+    return compile_template(template).render(content)
+
+
+def render_draft(content, template):
+    """Render draft text with a template straight to .docx bytes"""
+    with metrics.timed('draft_rendering'):
+        return compile_template(template).render_bytes(content)
 
 
 @app.route('/download-draft/<draft_id>', methods=['GET'])
 def download_draft(draft_id):
     """Download a generated draft document"""
     
-    if draft_id not in draft_cache:
+    draft_info = draft_cache.get(draft_id)
+    if draft_info is None:
         return jsonify({'error': 'Draft not found'}), 404
     
-    draft_info = draft_cache[draft_id]
-    
     try:
         return send_file(
-            draft_info['path'],
+            BytesIO(draft_info['content']),
             as_attachment=True,
             download_name=draft_info['filename'],
             mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
@@ -502,18 +968,43 @@ def download_draft(draft_id):
         return jsonify({'error': 'Error downloading draft'}), 500
 
 
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Report size and eviction metrics for the session stores, LLM cache, coalescing and admission, and the job queue"""
+    from worqhat_utils import worqhat_client
+    return jsonify({
+        'stores': {store.name: store.stats() for store in (document_cache, pdf_cache, draft_cache, session_documents,
+                                                           doc_chat_memory, general_chat_memory)},
+        'llm_cache': worqhat_client.cache_stats(),
+        'llm_coalescing': worqhat_client.single_flight.stats(),
+        'llm_admission': worqhat_client.admission.stats(),
+        'jobs': job_queue.stats()
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose request, stage and upstream timings and store sizes in the Prometheus text format"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/view-document', methods=['GET'])
 def view_document():
-    session_id = session.get('session_id')
-    if not session_id or session_id not in pdf_cache:
+    """Serve the stored PDF with byte-range, ETag and conditional GET support
+
+    The document id is a hash of the PDF bytes, so it doubles as a strong ETag.
+    """
+    document_id, record = resolve_document(request.args.get('document_id'))
+    pdf_content = pdf_cache.get(document_id) if document_id else None
+    if pdf_content is None:
         return jsonify({'error': 'No document found'}), 404
-    
-    # Create a temporary file to serve
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-    temp_file.write(pdf_cache[session_id])
-    temp_file.close()
-    
-    return send_file(temp_file.name, mimetype='application/pdf', as_attachment=False)
+
+    response = Response(pdf_content, mimetype='application/pdf')
+    response.set_etag(document_id)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    if record.get('filename'):
+        response.headers.set('Content-Disposition', 'inline', filename=record['filename'])
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(pdf_content))
 
 
 if __name__ == '__main__':
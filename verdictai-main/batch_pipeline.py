@@ -0,0 +1,164 @@
+import os
+import queue
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Batch processing configuration: workers per pipeline stage and input limits
+BATCH_EXTRACT_WORKERS = int(os.getenv('BATCH_EXTRACT_WORKERS', '2'))
+BATCH_CLASSIFY_WORKERS = int(os.getenv('BATCH_CLASSIFY_WORKERS', '4'))
+BATCH_ANALYZE_WORKERS = int(os.getenv('BATCH_ANALYZE_WORKERS', '4'))
+BATCH_MAX_DOCUMENTS = int(os.getenv('BATCH_MAX_DOCUMENTS', '200'))
+BATCH_MAX_ARCHIVE_BYTES = int(os.getenv('BATCH_MAX_ARCHIVE_BYTES', str(512 * 1024 * 1024)))
+
+
+class BatchTooLarge(ValueError):
+    """Raised when a batch exceeds the document count or archive size limits"""
+
+
+# Put on the done queue once every record has been submitted
+_FED_ALL = object()
+
+
+class Stage:
+    """One step of a pipeline: a function that updates a record in place, run on `workers` threads
+
+    Args:
+        name (str): Stage name, used in timings and error reports
+        func (callable): Called with the record dict; raise to fail the record at this stage
+        workers (int): Maximum number of records in this stage at once
+    """
+
+    def __init__(self, name, func, workers):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+
+
+class StagePipeline:
+    """Moves records through a fixed sequence of stages, each with its own concurrency limit
+
+    A record enters the next stage as soon as it leaves the previous one, so
+    slow upstream stages overlap with local parsing of later documents.
+    Finished records are yielded in completion order; a record that fails a
+    stage is yielded right away with `error` and `failed_stage` set.
+
+    Records are read lazily and at most `max_in_flight` of them are inside
+    the pipeline at once, so a fast early stage cannot pile up every
+    document ahead of a slow later one.
+
+    Args:
+        stages (list): The Stage objects, in order
+        max_in_flight (int): Records admitted before one finishes (default: twice the total stage workers)
+    """
+
+    def __init__(self, stages, max_in_flight=None):
+        self.stages = list(stages)
+        self.max_in_flight = max_in_flight or 2 * sum(stage.workers for stage in self.stages)
+
+    def run(self, records):
+        """Process records and yield each one when it is done
+
+        Args:
+            records (iterable): Record dicts; each is updated in place and gains a `timings` dict
+
+        Yields:
+            dict: Finished or failed records
+        """
+        done = queue.Queue()
+        executors = [ThreadPoolExecutor(max_workers=stage.workers, thread_name_prefix=f'batch-{stage.name}')
+                     for stage in self.stages]
+
+        def submit(position, record):
+            if position == len(self.stages):
+                done.put(record)
+                return
+            try:
+                executors[position].submit(run_stage, position, record)
+            except RuntimeError:
+                # The consumer went away and the pipeline was shut down
+                pass
+
+        def run_stage(position, record):
+            stage = self.stages[position]
+            started = time.perf_counter()
+            try:
+                stage.func(record)
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            # Finish writing to the record before handing it on; the consumer may serialize it right away
+            record.setdefault('timings', {})[stage.name] = round(time.perf_counter() - started, 3)
+            if error is not None:
+                record['error'] = str(error)
+                record['failed_stage'] = stage.name
+                retry_after = getattr(error, 'retry_after', None)
+                if retry_after is not None:
+                    record['retry_after'] = retry_after
+                done.put(record)
+                return
+            submit(position + 1, record)
+
+        slots = threading.Semaphore(self.max_in_flight)
+        stopped = threading.Event()
+        fed = {'count': 0, 'error': None}
+
+        def feed():
+            try:
+                for record in records:
+                    while not slots.acquire(timeout=0.5):
+                        if stopped.is_set():
+                            return
+                    if stopped.is_set():
+                        return
+                    fed['count'] += 1
+                    submit(0, record)
+            except Exception as e:
+                fed['error'] = e
+            finally:
+                done.put(_FED_ALL)
+
+        threading.Thread(target=feed, name='batch-feed', daemon=True).start()
+        finished = 0
+        fed_all = False
+        try:
+            while not (fed_all and finished == fed['count']):
+                record = done.get()
+                if record is _FED_ALL:
+                    fed_all = True
+                    continue
+                slots.release()
+                finished += 1
+                yield record
+            if fed['error'] is not None:
+                raise fed['error']
+        finally:
+            stopped.set()
+            for executor in executors:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_archive_pdfs(archive_file, max_documents=BATCH_MAX_DOCUMENTS, max_bytes=BATCH_MAX_ARCHIVE_BYTES):
+    """Yield (filename, bytes) for each PDF inside a zip archive
+
+    Sizes are checked against the archive's directory before anything is
+    decompressed, so oversized archives are rejected up front.
+
+    Raises:
+        BatchTooLarge: If the archive holds too many PDFs or too many uncompressed bytes
+        zipfile.BadZipFile: If the file is not a zip archive
+    """
+    with zipfile.ZipFile(archive_file) as archive:
+        entries = [info for info in archive.infolist()
+                   if not info.is_dir() and info.filename.lower().endswith('.pdf')
+                   and not os.path.basename(info.filename).startswith('._')
+                   and '__MACOSX/' not in info.filename]
+        if len(entries) > max_documents:
+            raise BatchTooLarge(f"Archive holds {len(entries)} PDFs; the limit is {max_documents}")
+        total = sum(info.file_size for info in entries)
+        if total > max_bytes:
+            raise BatchTooLarge(f"Archive expands to {total} bytes; the limit is {max_bytes}")
+        for info in entries:
+            yield os.path.basename(info.filename), archive.read(info)
@@ -0,0 +1,230 @@
+"""End-to-end benchmarks for VerdictAI against a local mock WorqHat server
+
+Starts the mock API, points the app at it, and measures PDF extraction,
+draft rendering and the /classify, /process, /chat and draft endpoints at
+several concurrency levels. Results are printed as a table and written
+as JSON so runs can be compared:
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --latency 0.5 --jitter 0.2 --error-rate 0.05 \\
+        --concurrency 1 8 32 --pages 1 100 500 --out results/baseline.json
+
+The LLM response cache is disabled unless --cache is given, so every
+request reaches the mock server.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from io import BytesIO
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from synthetic_pdf import build_pdf  # noqa: E402
+
+DRAFT_PARAGRAPH = ('The tenant shall remedy the breach described in the notice within thirty days of receipt, '
+                   'failing which the landlord may pursue the remedies available under the agreement.')
+
+
+def percentile(sorted_values, fraction):
+    """Linearly interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def measure(stage, call, concurrency, requests, **labels):
+    """Run call(i, state) `requests` times from `concurrency` threads and summarize latencies
+
+    Each thread gets its own `state` dict, e.g. for a per-thread test client.
+    A call counts as an error if it raises or returns a falsy value.
+
+    Returns:
+        dict: Latency percentiles in milliseconds, throughput and error count for the stage
+    """
+    counter = itertools.count()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        state = {}
+        while True:
+            index = next(counter)
+            if index >= requests:
+                return
+            started = time.perf_counter()
+            try:
+                ok = bool(call(index, state))
+                error = None if ok else 'failed'
+            except Exception as e:
+                ok, error = False, f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors.append(error)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    wall_started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_started
+
+    latencies.sort()
+    to_ms = lambda seconds: round(seconds * 1000, 2) if seconds is not None else None  # noqa: E731
+    return {
+        'stage': stage,
+        'concurrency': concurrency,
+        **labels,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'p50_ms': to_ms(percentile(latencies, 0.50)),
+        'p95_ms': to_ms(percentile(latencies, 0.95)),
+        'p99_ms': to_ms(percentile(latencies, 0.99)),
+        'mean_ms': to_ms(sum(latencies) / len(latencies)) if latencies else None,
+        'max_ms': to_ms(latencies[-1]) if latencies else None,
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+        'wall_seconds': round(wall, 3),
+    }
+
+
+def upload(pdf_bytes, name):
+    from werkzeug.datastructures import FileStorage
+    return FileStorage(BytesIO(pdf_bytes), filename=name, content_type='application/pdf')
+
+
+def run(args):
+    from mock_worqhat import start_server
+    server, url = start_server(latency=args.latency, jitter=args.jitter, chunk_delay=0.0,
+                               error_rate=args.error_rate, error_status=args.error_status)
+    os.environ['WORQHAT_BASE_URL'] = url
+    if not args.cache:
+        os.environ['LLM_CACHE_ENABLED'] = '0'
+    os.environ.pop('MODEL_WARMUP', None)
+
+    import app as verdict_app
+    app = verdict_app.app
+    app.logger.disabled = True
+    results = []
+
+    def record(result):
+        results.append(result)
+        detail = f"pages={result['pages']}" if 'pages' in result else result.get('template', '')
+        print(f"{result['stage']:<28} c={result['concurrency']:<3} {detail:<26} "
+              f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+              f"{result['throughput_rps']} req/s errors={result['errors']}", flush=True)
+
+    seeds = itertools.count(1)
+
+    # PDF text extraction, directly
+    for pages in args.pages:
+        pdf_bytes = build_pdf(pages, seed=next(seeds))
+        for concurrency in args.concurrency:
+            record(measure(
+                'extract_text_from_pdf',
+                lambda i, state: verdict_app.extract_text_from_pdf(upload(pdf_bytes, 'bench.pdf')),
+                concurrency, max(args.extract_requests, concurrency), pages=pages, pdf_bytes=len(pdf_bytes)))
+
+    # Draft rendering, directly
+    draft_content = '\n'.join(['NOTICE OF BREACH', 'January 15, 2024', '', 'Dear Sir or Madam,', '']
+                              + [DRAFT_PARAGRAPH] * args.draft_paragraphs
+                              + ['', 'Sincerely,', 'Counsel for the Landlord'])
+    for template_name, template in verdict_app.DRAFT_TEMPLATES.items():
+        for concurrency in args.concurrency:
+            record(measure(
+                'create_formatted_document',
+                lambda i, state: verdict_app.create_formatted_document(draft_content, template).save(BytesIO()) or True,
+                concurrency, max(args.requests, concurrency), template=template_name,
+                paragraphs=args.draft_paragraphs))
+
+    # Endpoints through the Flask test client, one client (and session) per thread
+    def client(state):
+        if 'client' not in state:
+            state['client'] = app.test_client()
+        return state['client']
+
+    setup = app.test_client().post('/classify', data={'document': upload(build_pdf(args.http_pages, seed=0), 'setup.pdf')},
+                                   content_type='multipart/form-data')
+    document_id = (setup.get_json(silent=True) or {}).get('document_id')
+    if not document_id:
+        raise SystemExit(f"Setup upload failed: {setup.status_code} {setup.get_data(as_text=True)[:200]}")
+
+    def classify(i, state):
+        # A fresh PDF per request so extraction is not skipped by the content-hash registry
+        pdf = upload(build_pdf(args.http_pages, seed=next(seeds)), 'bench.pdf')
+        return client(state).post('/classify', data={'document': pdf}, content_type='multipart/form-data').status_code == 200
+
+    def process(i, state):
+        return client(state).post('/process', data={'document_id': document_id, 'category': 'Legal Notice'}).status_code == 200
+
+    def chat(i, state):
+        return client(state).post('/chat', json={
+            'message': f"What are the termination obligations? ({i})", 'category': 'Legal Notice',
+            'document_id': document_id}).status_code == 200
+
+    def draft(i, state):
+        return client(state).post('/chat', json={
+            'message': f"Draft a reply to this notice ({i})", 'category': 'Legal Notice', 'document_id': document_id,
+            'generate_draft': True, 'draft_instructions': 'Formal tone'}).status_code == 200
+
+    for stage, call in (('POST /classify', classify), ('POST /process', process),
+                        ('POST /chat', chat), ('POST /chat (draft)', draft)):
+        for concurrency in args.concurrency:
+            record(measure(stage, call, concurrency, max(args.requests, concurrency), pages=args.http_pages))
+
+    server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark VerdictAI against a local mock WorqHat server')
+    parser.add_argument('--latency', type=float, default=0.2, help='Mock upstream latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Extra random mock latency of up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of mock requests that fail')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status of injected mock failures')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 500],
+                        help='PDF sizes for the extraction benchmark')
+    parser.add_argument('--http-pages', type=int, default=10, help='PDF size used for endpoint benchmarks')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per stage and concurrency level')
+    parser.add_argument('--extract-requests', type=int, default=5, help='Extractions per PDF size and concurrency level')
+    parser.add_argument('--draft-paragraphs', type=int, default=40)
+    parser.add_argument('--cache', action='store_true', help='Keep the LLM response cache enabled')
+    parser.add_argument('--out', default=None, help='JSON output path (default: benchmarks/results/<timestamp>.json)')
+    args = parser.parse_args()
+
+    started_at = datetime.datetime.now()
+    results = run(args)
+
+    report = {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'config': {key: value for key, value in vars(args).items() if key != 'out'},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+    out = args.out or os.path.join(BENCHMARK_DIR, 'results', f"benchmark-{started_at:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Generate synthetic legal-looking PDFs of any length without extra dependencies
+
+    python benchmarks/synthetic_pdf.py --pages 500 --out contract_500.pdf
+"""
+import argparse
+import random
+
+LINES_PER_PAGE = 40
+_CLAUSE_WORDS = (
+    'agreement party parties shall hereby notice tenant landlord licensor licensee payment term termination '
+    'obligation breach remedy indemnify warrant represent confidential jurisdiction arbitration clause schedule '
+    'effective date consideration liability damages assignment governing law dispute amendment waiver'
+).split()
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def page_lines(page_number, rng):
+    """Build the text lines for one page, opening with a numbered section heading"""
+    lines = [f"SECTION {page_number}. TERMS AND CONDITIONS"]
+    for _ in range(LINES_PER_PAGE - 1):
+        words = [rng.choice(_CLAUSE_WORDS) for _ in range(rng.randint(8, 14))]
+        lines.append(' '.join(words).capitalize() + '.')
+    return lines
+
+
+def build_pdf(pages, seed=0, title='SYNTHETIC AGREEMENT'):
+    """Build a text PDF with the given number of pages
+
+    Args:
+        pages (int): Number of pages
+        seed (int): Seed for the generated wording; different seeds give different file hashes
+        title (str): Heading on the first page
+
+    Returns:
+        bytes: The PDF file
+    """
+    rng = random.Random(seed)
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    pages_id = add(None)  # Filled in once the page ids are known
+    page_ids = []
+    for page_number in range(1, pages + 1):
+        lines = page_lines(page_number, rng)
+        if page_number == 1:
+            lines = [title, f"Reference {seed}"] + lines
+        stream = ['BT', '/F1 10 Tf', '12 TL', '50 760 Td']
+        for line in lines:
+            stream.append(f"({_escape(line)}) Tj T*")
+        stream.append('ET')
+        content = '\n'.join(stream).encode('latin-1')
+        content_id = add(b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+        page_ids.append(add(
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] '
+            b'/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>' % (pages_id, font_id, content_id)
+        ))
+    kids = b' '.join(b'%d 0 R' % page_id for page_id in page_ids)
+    objects[pages_id - 1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(page_ids))
+    catalog_id = add(b'<< /Type /Catalog /Pages %d 0 R >>' % pages_id)
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref_offset = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        output += b'%010d 00000 n \n' % offset
+    output += b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objects) + 1, catalog_id, xref_offset)
+    return bytes(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic multi-page PDF')
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args()
+    with open(args.out, 'wb') as f:
+        f.write(build_pdf(args.pages, args.seed))
+
+
+if __name__ == '__main__':
+    main()
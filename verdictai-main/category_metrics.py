@@ -0,0 +1,227 @@
+import datetime
+import os
+import re
+
+# Category metrics configuration: follow-up calls for metrics missing from the first answer
+CATEGORY_METRICS_RETRIES = int(os.getenv('CATEGORY_METRICS_RETRIES', '1'))
+
+CATEGORY_METRICS = {
+    'Legal Notice': [
+        'Severity Score', 'Violations & Broken Rules', 'Legal Consequences', 'Actionable Steps',
+        'Urgency Detection', 'Tone Analysis', 'Recommended Actions'
+    ],
+    'Ownership Documents': [
+        'Ownership Rights & Obligations', 'Transfer, Leasing, Sale, Mortgaging Clauses',
+        'Financial Liabilities', 'Terms & Conditions', 'Important Dates', 'Document Validity', 'Summary Type'
+    ],
+    'Contracts & Agreements': [
+        'Parties Involved & Roles', 'Terms & Conditions', 'Termination Clauses', 'Penalties for Breach',
+        'Severity Score', 'Obligations & Rights', 'Actionable Steps'
+    ],
+    'Financial Documents': [
+        'Financial Obligations', 'Coverage Details', 'Deadlines & Payment Schedules',
+        'Legal Implications', 'Severity Score', 'Urgency Detection', 'Risk Analysis'
+    ],
+    'Terms & Conditions / Privacy Policies': [
+        'User Rights & Restrictions', 'Data Usage & Privacy Clauses', 'Liability Clauses',
+        'Termination & Suspension Rules', 'Severity Score', 'Personal Implications', 'Suggested Actions'
+    ],
+    'Intellectual Property Documents': [
+        'Ownership & Usage Rights', 'Infringement Clauses', 'Exclusivity & Licensing Terms',
+        'Penalties for Violation', 'Severity Score', 'Urgency Detection', 'Recommended Actions'
+    ],
+    'Criminal Offense Documents': [
+        'Charges Filed', 'Potential Penalties', 'Required Actions', 'Severity Score',
+        'Urgency Detection', 'Tone Analysis', 'Suggested Actions'
+    ],
+    'Regulatory Compliance Documents': [
+        'Compliance Requirements', 'Penalties for Non-Compliance', 'Renewal Deadlines & Conditions',
+        'Guidelines for Rectification', 'Severity Score', 'Urgency Detection', 'Recommended Actions'
+    ],
+    'Employment Documents': [
+        'Terms of Employment', 'Termination Conditions', 'Confidentiality Clauses',
+        'Breach Consequences', 'Severity Score', 'Urgency Detection', 'Suggested Actions'
+    ],
+    'Court Judgments & Legal Precedents': [
+        'Summary of Judgment', 'Legal Basis', 'Potential Consequences',
+        'Severity Score', 'Urgency Detection', 'Recommended Actions'
+    ]
+}
+
+URGENCY_LEVELS = ('low', 'medium', 'high', 'critical')
+
+# Value type of each metric; any metric not listed here is free text
+METRIC_TYPES = {
+    'Severity Score': 'score',
+    'Urgency Detection': 'level',
+    'Violations & Broken Rules': 'list',
+    'Actionable Steps': 'list',
+    'Recommended Actions': 'list',
+    'Suggested Actions': 'list',
+    'Required Actions': 'list',
+    'Important Dates': 'list',
+    'Deadlines & Payment Schedules': 'list',
+    'Renewal Deadlines & Conditions': 'list',
+    'Parties Involved & Roles': 'list',
+    'Charges Filed': 'list',
+    'Compliance Requirements': 'list',
+    'Guidelines for Rectification': 'list',
+}
+
+# How each type is described to the model in the requested JSON layout
+TYPE_FORMATS = {
+    'score': '{"score": <integer 1-10, 10 most severe>, "reason": "<one sentence>"}',
+    'level': '{"level": "<' + '|'.join(URGENCY_LEVELS) + '>", "reason": "<one sentence>"}',
+    'list': '["<item>", ...] (an empty list if there are none)',
+    'text': '"<a few sentences>"',
+}
+
+
+def metric_type(metric):
+    return METRIC_TYPES.get(metric, 'text')
+
+
+def _normalize_key(key):
+    return re.sub(r'[^a-z0-9]', '', str(key).lower())
+
+
+def _reason(value):
+    reason = value.get('reason') or value.get('explanation') or ''
+    return str(reason).strip()
+
+
+def coerce_metric(metric, value):
+    """Validate a metric value from the model's JSON and convert it to the metric's type
+
+    Args:
+        metric (str): The metric name
+        value: The value decoded from the response
+
+    Returns:
+        The typed value: a {'score', 'reason'} or {'level', 'reason'} dict, a list of strings or a string
+
+    Raises:
+        ValueError: If the value is missing or does not fit the metric's type
+    """
+    kind = metric_type(metric)
+    if value is None:
+        raise ValueError(f"{metric} is missing")
+
+    if kind == 'score':
+        details = value if isinstance(value, dict) else {'score': value}
+        try:
+            score = float(details.get('score'))
+        except (TypeError, ValueError):
+            raise ValueError(f"{metric} has no numeric score")
+        if not 1 <= score <= 10:
+            raise ValueError(f"{metric} score {score} is outside 1-10")
+        return {'score': int(round(score)), 'reason': _reason(details)}
+
+    if kind == 'level':
+        details = value if isinstance(value, dict) else {'level': value}
+        level = str(details.get('level') or '').strip().lower()
+        if level not in URGENCY_LEVELS:
+            raise ValueError(f"{metric} level {level!r} is not one of {', '.join(URGENCY_LEVELS)}")
+        return {'level': level, 'reason': _reason(details)}
+
+    if kind == 'list':
+        if isinstance(value, str):
+            value = [line.strip(' -*\t') for line in value.splitlines()]
+        if not isinstance(value, list):
+            raise ValueError(f"{metric} is not a list")
+        return [str(item).strip() for item in value if str(item).strip()]
+
+    if isinstance(value, list):
+        value = '\n'.join(str(item) for item in value)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{metric} is empty")
+    return value.strip()
+
+
+def build_metrics_prompt(category, metrics, document_context):
+    """Build one prompt asking for all the given metrics as a single JSON object"""
+    layout = ',\n'.join(f'  "{metric}": {TYPE_FORMATS[metric_type(metric)]}' for metric in metrics)
+    return f"""You are a legal analyst reviewing a {category} document.
+Assess the document below and answer with a single JSON object and nothing else, using exactly these keys:
+{{
+{layout}
+}}
+Base every value on the document only. If the document says nothing about a metric, say so in its value.
+
+Document excerpts:
+{document_context}
+"""
+
+
+def parse_metrics(response, metrics):
+    """Extract the typed values of the requested metrics from a model response
+
+    Keys are matched ignoring case and punctuation, so "severity_score"
+    fills 'Severity Score'.
+
+    Returns:
+        tuple: A dict of valid metric values and a dict of problems for the rest
+    """
+    from worqhat_utils import parse_json_object
+    data = parse_json_object(response)
+    if data is None:
+        return {}, {metric: 'Response held no JSON object' for metric in metrics}
+
+    by_key = {_normalize_key(key): value for key, value in data.items()}
+    values, problems = {}, {}
+    for metric in metrics:
+        try:
+            values[metric] = coerce_metric(metric, by_key.get(_normalize_key(metric)))
+        except ValueError as e:
+            problems[metric] = str(e)
+    return values, problems
+
+
+def extract_category_metrics(category, document_context, previous=None, retries=None, generate=None):
+    """Compute every metric of a category with one structured call, retrying only the metrics that failed
+
+    Args:
+        category (str): A key of CATEGORY_METRICS
+        document_context (str): The document text or excerpts to assess
+        previous (dict): An earlier, partial report for the same document; its valid metrics are kept
+        retries (int): Follow-up calls for metrics missing after the first (default: CATEGORY_METRICS_RETRIES)
+        generate (callable): Called with a prompt and the attempt number, returns the model's text
+            (default: the WorqHat client)
+
+    Returns:
+        dict: The report, with `metrics` (name to typed value or None), `missing`, `problems` and `calls`
+
+    Raises:
+        KeyError: If the category has no metrics defined
+        UpstreamUnavailable: If WorqHat is unavailable
+    """
+    if generate is None:
+        from worqhat_utils import worqhat_client
+        # The first call may be served from the cache; follow-ups must reach the model again
+        generate = lambda prompt, attempt: worqhat_client.generate_text(prompt, use_cache=attempt == 0)
+    retries = CATEGORY_METRICS_RETRIES if retries is None else retries
+
+    metrics = CATEGORY_METRICS[category]
+    values = {metric: value for metric, value in ((previous or {}).get('metrics') or {}).items()
+              if metric in metrics and value is not None}
+    problems = {}
+    calls = 0
+    for attempt in range(retries + 1):
+        pending = [metric for metric in metrics if metric not in values]
+        if not pending:
+            break
+        response = generate(build_metrics_prompt(category, pending, document_context), attempt)
+        calls += 1
+        found, problems = parse_metrics(response, pending)
+        values.update(found)
+
+    missing = [metric for metric in metrics if metric not in values]
+    return {
+        'category': category,
+        'metrics': {metric: values.get(metric) for metric in metrics},
+        'types': {metric: metric_type(metric) for metric in metrics},
+        'missing': missing,
+        'problems': {metric: problems[metric] for metric in missing if metric in problems},
+        'calls': calls,
+        'generated_at': datetime.datetime.now().isoformat()
+    }
@@ -0,0 +1,87 @@
+import os
+import re
+import threading
+
+# Conversation memory configuration, in characters (roughly four characters per token)
+CHAT_MEMORY_MAX_CHARS = int(os.getenv('CHAT_MEMORY_MAX_CHARS', '4000'))
+CHAT_MEMORY_SUMMARY_CHARS = int(os.getenv('CHAT_MEMORY_SUMMARY_CHARS', '1500'))
+CHAT_MEMORY_POINT_CHARS = 200
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+
+
+def _first_sentence(text, limit=CHAT_MEMORY_POINT_CHARS):
+    text = ' '.join(text.split()).replace('**', '')
+    sentence = _SENTENCE_END.split(text, 1)[0]
+    if len(sentence) > limit:
+        sentence = sentence[:limit].rsplit(' ', 1)[0] + '...'
+    return sentence
+
+
+def compact_turn(turn):
+    """Condense one exchange to a single summary line without an LLM call"""
+    return f"- Asked: {_first_sentence(turn['user'])} Answered: {_first_sentence(turn['bot'])}"
+
+
+class ConversationMemory:
+    """Chat history that keeps recent turns verbatim within a character budget
+
+    When the verbatim turns exceed `max_chars`, the oldest turns are folded
+    into a running summary, which is itself trimmed to `summary_chars` by
+    dropping its oldest points. The rendered history therefore stays within
+    roughly `max_chars + summary_chars` however long the conversation runs.
+
+    Args:
+        max_chars (int): Budget for turns kept verbatim
+        summary_chars (int): Budget for the running summary of older turns
+        summarize (callable): Turns one {'user', 'bot', 'speaker'} turn into a summary line
+    """
+
+    def __init__(self, max_chars=CHAT_MEMORY_MAX_CHARS, summary_chars=CHAT_MEMORY_SUMMARY_CHARS, summarize=compact_turn):
+        self.max_chars = max_chars
+        self.summary_chars = summary_chars
+        self.summarize = summarize
+        self.turns = []
+        self.summary_points = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _render_turn(turn):
+        return f"\nUser: {turn['user']}\n{turn['speaker']}: {turn['bot']}\n"
+
+    def add_turn(self, user_message, bot_response, speaker='Bot'):
+        """Record one exchange and compact older turns if the budget is exceeded"""
+        with self._lock:
+            self.turns.append({'user': user_message, 'bot': bot_response, 'speaker': speaker})
+            self._compact()
+
+    def _compact(self):
+        verbatim = sum(len(self._render_turn(turn)) for turn in self.turns)
+        # Always keep the latest turn verbatim so follow-up questions have their antecedent
+        while verbatim > self.max_chars and len(self.turns) > 1:
+            turn = self.turns.pop(0)
+            verbatim -= len(self._render_turn(turn))
+            self.summary_points.append(self.summarize(turn))
+        while self.summary_points and sum(len(point) + 1 for point in self.summary_points) > self.summary_chars:
+            self.summary_points.pop(0)
+
+    def render(self):
+        """Render the history for inclusion in a prompt"""
+        with self._lock:
+            parts = []
+            if self.summary_points:
+                parts.append("Summary of earlier conversation:\n" + '\n'.join(self.summary_points) + '\n')
+            parts.extend(self._render_turn(turn) for turn in self.turns)
+            return ''.join(parts)
+
+    def estimated_size(self):
+        return sum(len(turn['user']) + len(turn['bot']) for turn in self.turns) + sum(len(p) for p in self.summary_points)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
@@ -0,0 +1,130 @@
+import re
+import threading
+from io import BytesIO
+
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Pt, Inches
+
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+          'september', 'october', 'november', 'december']
+SALUTATIONS = ['dear', 'to whom', 'attention', 'attn', 're:', 'subject:']
+CLOSINGS = ['sincerely', 'regards', 'truly', 'thank you', 'best', 'respectfully']
+
+# Precompiled line classifier; matches the same substrings as the original keyword loops
+_MONTH = re.compile('|'.join(MONTHS), re.IGNORECASE)
+_DAY = re.compile(r'[1-9]')  # Any of the day numbers 1-31 appears as a substring iff a digit 1-9 does
+_SALUTATION = re.compile('|'.join(re.escape(word) for word in SALUTATIONS), re.IGNORECASE)
+_CLOSING = re.compile('|'.join(re.escape(word) for word in CLOSINGS), re.IGNORECASE)
+
+STYLE_NAMES = {
+    'header': 'Draft Header',
+    'body': 'Draft Body',
+    'signature': 'Draft Signature',
+}
+
+
+def classify_line(line, current_section, includes_date=True):
+    """Return the draft section a line belongs to, given the section of the previous line"""
+    if current_section == 'header' and includes_date and _MONTH.search(line) and _DAY.search(line):
+        return 'date'
+    if current_section in ('header', 'date') and _SALUTATION.search(line):
+        return 'salutation'
+    if current_section in ('header', 'date', 'salutation') and _CLOSING.search(line):
+        return 'signature'
+    if current_section in ('header', 'date', 'salutation') and len(line) > 20:
+        return 'body'
+    return current_section
+
+
+class CompiledTemplate:
+    """A draft template compiled once into a base document with named paragraph styles
+
+    The margins and the header, body and signature styles are built a
+    single time and serialized; each draft starts from a copy of that base
+    document, so rendering only adds paragraphs.
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self.includes_date = template['includes_date']
+        self._base = self._build_base()
+
+    def _build_base(self):
+        template = self.template
+        doc = Document()
+        for section in doc.sections:
+            section.top_margin = Inches(template['margins']['top'])
+            section.bottom_margin = Inches(template['margins']['bottom'])
+            section.left_margin = Inches(template['margins']['left'])
+            section.right_margin = Inches(template['margins']['right'])
+
+        formats = {
+            'header': (template['header_format'], template['header_format']['align']),
+            'body': (template['body_format'], 'left'),
+            'signature': (template['signature_format'], 'left'),
+        }
+        for key, (fmt, align) in formats.items():
+            style = doc.styles.add_style(STYLE_NAMES[key], WD_STYLE_TYPE.PARAGRAPH)
+            style.base_style = doc.styles['Normal']
+            style.font.name = fmt['font']
+            style.font.size = Pt(fmt['size'])
+            style.font.bold = fmt.get('bold')
+            style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER if align == 'center' else WD_ALIGN_PARAGRAPH.LEFT
+
+        buffer = BytesIO()
+        doc.save(buffer)
+        return buffer.getvalue()
+
+    def new_document(self):
+        return Document(BytesIO(self._base))
+
+    def render(self, content):
+        """Build a formatted document from draft text
+
+        Args:
+            content (str): The draft text, one paragraph per line
+
+        Returns:
+            Document: The formatted Word document
+        """
+        doc = self.new_document()
+        styles = {key: doc.styles[name] for key, name in STYLE_NAMES.items()}
+        # Dates and salutations are set in the body style
+        section_styles = {'header': styles['header'], 'date': styles['body'], 'salutation': styles['body'],
+                          'body': styles['body'], 'signature': styles['signature']}
+
+        current_section = 'header'
+        for line in content.split('\n'):
+            line = line.strip()
+            if not line:
+                # Add empty paragraph for spacing
+                doc.add_paragraph()
+                continue
+            current_section = classify_line(line, current_section, self.includes_date)
+            doc.add_paragraph(line, style=section_styles[current_section])
+        return doc
+
+    def render_bytes(self, content):
+        """Render draft text straight to .docx bytes"""
+        buffer = BytesIO()
+        self.render(content).save(buffer)
+        return buffer.getvalue()
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_template(template):
+    """Return the compiled form of a template dict, compiling it on first use"""
+    key = id(template)
+    compiled = _compiled.get(key)
+    if compiled is None or compiled.template is not template:
+        with _compiled_lock:
+            compiled = _compiled.get(key)
+            if compiled is None or compiled.template is not template:
+                compiled = CompiledTemplate(template)
+                _compiled[key] = compiled
+    return compiled
@@ -0,0 +1,29 @@
+"""Production launch settings
+
+Runs the app under several worker processes:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Each worker serves many requests at once on threads, since most of a
+request's time is spent waiting on WorqHat or streaming tokens. With more
+than one worker the session stores must be shared, so the SQLite state
+backend is selected unless STATE_BACKEND says otherwise. Every worker
+starts its own PDF extraction pool, so the CPUs are split between them
+unless PDF_EXTRACT_WORKERS is set.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', str(multiprocessing.cpu_count())))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+# Long enough for a WorqHat read timeout plus retries, and for streamed answers
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '180'))
+graceful_timeout = 30
+keepalive = 5
+
+# Workers import the app after this file runs, so they see these defaults
+if workers > 1:
+    os.environ.setdefault('STATE_BACKEND', 'sqlite')
+os.environ.setdefault('PDF_EXTRACT_WORKERS', str(max(1, multiprocessing.cpu_count() // workers)))
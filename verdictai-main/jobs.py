@@ -0,0 +1,238 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+# Background job configuration
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '64'))
+JOB_RESULT_TTL = float(os.getenv('JOB_RESULT_TTL', str(3600)))
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class Job:
+    """One unit of background work, with progress and partial results visible while it runs
+
+    Args:
+        kind (str): Short name of the work, e.g. 'process' or 'draft'
+        func (callable): Called as func(job) on a worker thread; its return value is the result
+        steps (int): Number of progress steps the job reports, used to compute a fraction
+    """
+
+    def __init__(self, kind, func, steps=1):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.func = func
+        self.steps = max(1, steps)
+        self.completed_steps = 0
+        self.stage = None
+        self.partial = {}
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.on_change = None
+        self._lock = threading.Lock()
+
+    def update(self, stage=None, step=False, **partial):
+        """Report progress from inside the job
+
+        Args:
+            stage (str): Description of what the job is doing now
+            step (bool): Whether one of the job's steps has just finished
+            **partial: Partial results to expose before the job completes
+        """
+        with self._lock:
+            if stage is not None:
+                self.stage = stage
+            if step:
+                self.completed_steps = min(self.completed_steps + 1, self.steps)
+            self.partial.update(partial)
+        self.changed()
+
+    def changed(self):
+        """Tell the owning queue the job's status or progress moved on"""
+        if self.on_change is not None:
+            try:
+                self.on_change(self)
+            except Exception as e:
+                logger.warning("Could not publish job %s: %s", self.id, e)
+
+    def report(self, key, value):
+        """Record one finished step's result and return it, for use inside fanned-out calls"""
+        self.update(step=True, **{key: value})
+        return value
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self):
+        with self._lock:
+            progress = 1.0 if self.status == DONE else self.completed_steps / self.steps
+            data = {
+                'job_id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'progress': round(progress, 3),
+                'stage': self.stage,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+            }
+            if self.status == DONE:
+                data['result'] = self.result
+            else:
+                data['partial'] = dict(self.partial)
+            if self.status == FAILED:
+                data['error'] = self.error
+            return data
+
+
+class JobQueue:
+    """Bounded queue of background jobs served by a fixed pool of worker threads
+
+    Submitting never blocks: when `max_queued` jobs are already waiting,
+    QueueFull is raised so the caller can answer 503. Finished jobs stay
+    readable for `result_ttl` seconds after completion.
+
+    Jobs run in the process that accepted them. When the app runs under
+    several worker processes, pass a shared `store` and every status change
+    is published to it, so any worker can answer a status request.
+
+    Args:
+        workers (int): Number of worker threads
+        max_queued (int): Maximum number of jobs waiting to start
+        result_ttl (float): Seconds a finished job is kept
+        store: Shared session store job statuses are published to, or None
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE, result_ttl=JOB_RESULT_TTL, store=None):
+        self.workers = max(1, workers)
+        self.result_ttl = result_ttl
+        self.store = store
+        self.name = 'jobs'
+        self._queue = queue.Queue(maxsize=max(1, max_queued))
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._counts = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'expired': 0}
+
+    def _start_workers(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'job-worker-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, kind, func, steps=1):
+        """Queue func(job) to run in the background
+
+        Returns:
+            Job: The queued job
+
+        Raises:
+            QueueFull: If the queue is at capacity
+        """
+        self._start_workers()
+        job = Job(kind, func, steps)
+        if self.store is not None:
+            job.on_change = self._publish
+        with self._lock:
+            self._jobs[job.id] = job
+        # Published before a worker can pick it up, so the queued status never overwrites a later one
+        job.changed()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+                self._counts['rejected'] += 1
+            if self.store is not None:
+                self.store.delete(job.id)
+            raise QueueFull(f"Job queue is full ({self._queue.maxsize} waiting)")
+        with self._lock:
+            self._counts['submitted'] += 1
+        return job
+
+    def _publish(self, job):
+        self.store.set(job.id, job.to_dict(), ttl=self.result_ttl)
+
+    def get(self, job_id):
+        """Return a job by id, or None if unknown or expired"""
+        self.purge_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """Return a job's status dict, looking in the shared store for jobs run by other processes
+
+        Returns:
+            dict: The job's status as given by Job.to_dict, or None if unknown or expired
+        """
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self.store.get(job_id) if self.store is not None else None
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.status = RUNNING
+            job.started_at = time.time()
+            job.changed()
+            try:
+                result = job.func(job)
+                with job._lock:
+                    job.result = result
+                    job.status = DONE
+                outcome = 'completed'
+            except Exception as e:
+                logger.exception("Job %s (%s) failed", job.id, job.kind)
+                with job._lock:
+                    job.error = str(e)
+                    job.status = FAILED
+                outcome = 'failed'
+            job.finished_at = time.time()
+            job.func = None
+            job.changed()
+            with self._lock:
+                self._counts[outcome] += 1
+            self._queue.task_done()
+
+    def purge_expired(self):
+        """Drop finished jobs whose results have outlived the TTL"""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at is not None and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+            self._counts['expired'] += len(expired)
+        return len(expired)
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == RUNNING)
+            return {
+                'workers': self.workers,
+                'queued': self._queue.qsize(),
+                'max_queued': self._queue.maxsize,
+                'running': running,
+                'retained': len(self._jobs),
+                **self._counts
+            }
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Cache configuration
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+LLM_CACHE_MEMORY_BYTES = int(os.getenv('LLM_CACHE_MEMORY_BYTES', str(64 * 1024 * 1024)))
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'llm_cache.sqlite3'))
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))
+LLM_CACHE_MAX_DISK_BYTES = int(os.getenv('LLM_CACHE_MAX_DISK_BYTES', str(1024 * 1024 * 1024)))
+
+
+def make_cache_key(payload):
+    """Build a content-addressed key from the fields that determine an LLM response
+
+    Args:
+        payload (dict): The request payload sent to the content endpoint
+
+    Returns:
+        str: Hex SHA-256 digest of the prompt, model name and randomness
+    """
+    material = json.dumps({
+        'question': payload.get('question', ''),
+        'model': payload.get('model', ''),
+        'randomness': payload.get('randomness')
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class MemoryTier:
+    """In-process LRU cache bounded by the total size of its values in bytes"""
+
+    def __init__(self, max_bytes=LLM_CACHE_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(key, value):
+        return len(key) + len(value.encode('utf-8'))
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= self._size(key, previous)
+            self._entries[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                old_key, old_value = self._entries.popitem(last=False)
+                self.current_bytes -= self._size(old_key, old_value)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteTier:
+    """Persistent cache tier stored in a SQLite database, with a time-to-live per entry
+
+    Most prompts are unique and never read again, so expired rows are
+    purged and the oldest rows evicted past `max_bytes` every
+    `MAINTAIN_EVERY` writes rather than only when a key is looked up.
+    """
+
+    MAINTAIN_EVERY = 256
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_DISK_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        # SQLite connections cannot be shared across threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if time.time() - created_at > self.ttl:
+            self._connect().execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            return None
+        return value
+
+    def set(self, key, value):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, created_at) VALUES (?, ?, ?)",
+            (key, value, time.time())
+        )
+        with self._writes_lock:
+            self._writes += 1
+            maintain = self._writes % self.MAINTAIN_EVERY == 0
+        if maintain:
+            self.purge_expired()
+            self.enforce()
+
+    def purge_expired(self):
+        """Delete every expired entry and return how many were removed"""
+        cursor = self._connect().execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,)
+        )
+        return cursor.rowcount
+
+    def enforce(self):
+        """Evict the oldest entries until the stored keys and values fit in max_bytes; return how many were removed"""
+        conn = self._connect()
+        total = conn.execute("SELECT COALESCE(SUM(length(key) + length(value)), 0) FROM llm_cache").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return 0
+        evicted = []
+        for key, size in conn.execute(
+                "SELECT key, length(key) + length(value) FROM llm_cache ORDER BY created_at").fetchall():
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess -= size
+        conn.executemany("DELETE FROM llm_cache WHERE key = ?", evicted)
+        return len(evicted)
+
+    def clear(self):
+        self._connect().execute("DELETE FROM llm_cache")
+
+
+class ResponseCache:
+    """Two-tier LLM response cache: an LRU memory tier in front of an optional SQLite tier
+
+    Disk hits are promoted into the memory tier. Only successful responses
+    should be stored; error responses are never cached by the client.
+    """
+
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory if memory is not None else MemoryTier()
+        self.disk = disk
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0, 'disk_errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+        if self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except sqlite3.Error:
+                self._count('disk_errors')
+                value = None
+            if value is not None:
+                self._count('disk_hits')
+                self.memory.set(key, value)
+                return value
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        self._count('sets')
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except sqlite3.Error:
+                self._count('disk_errors')
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current memory tier size"""
+        with self._lock:
+            stats = dict(self._stats)
+        hits = stats['memory_hits'] + stats['disk_hits']
+        lookups = hits + stats['misses']
+        stats['hit_ratio'] = hits / lookups if lookups else 0.0
+        stats['memory_entries'] = len(self.memory)
+        stats['memory_bytes'] = self.memory.current_bytes
+        stats['memory_evictions'] = self.memory.evictions
+        return stats
+
+
+def create_default_cache():
+    """Build the cache configured through the LLM_CACHE_* environment variables
+
+    Returns:
+        ResponseCache: The configured cache, or None when caching is disabled
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    disk = None
+    if LLM_CACHE_PATH:
+        try:
+            disk = SQLiteTier(LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_DISK_BYTES)
+        except sqlite3.Error:
+            disk = None
+    return ResponseCache(MemoryTier(LLM_CACHE_MEMORY_BYTES), disk)
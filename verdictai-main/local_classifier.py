@@ -0,0 +1,201 @@
+"""Local TF-IDF + logistic regression classifier for legal document categories
+
+Train a model from labelled documents, then DocumentClassifier answers
+from it in milliseconds and only calls the LLM when confidence is low:
+
+    python local_classifier.py train --data labelled.jsonl
+    python local_classifier.py train --data labelled_docs/ --holdout 0.2
+    python local_classifier.py predict notice.pdf
+
+Training data is either a JSONL file of {"text": ..., "label": ...} records
+or a directory with one sub-directory of .pdf/.txt files per category,
+named after the category (e.g. "legal_notice", "terms_conditions_privacy_policies").
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+
+import joblib
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+# Local classifier configuration
+LOCAL_CLASSIFIER_MODEL = os.getenv(
+    'LOCAL_CLASSIFIER_MODEL',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'document_classifier.joblib')
+)
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv('LOCAL_CLASSIFIER_THRESHOLD', '0.6'))
+LOCAL_CLASSIFIER_MAX_CHARS = 20000
+
+
+def _slug(name):
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+
+class LocalClassifier:
+    """Trained text classifier returning a category and a confidence score"""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    @property
+    def labels(self):
+        return list(self.pipeline.classes_)
+
+    @classmethod
+    def train(cls, texts, labels):
+        """Fit a new classifier on document texts and their category labels"""
+        pipeline = Pipeline([
+            ('tfidf', TfidfVectorizer(sublinear_tf=True, ngram_range=(1, 2), min_df=1,
+                                      max_features=50000, stop_words='english')),
+            ('model', LogisticRegression(max_iter=2000, C=5.0, class_weight='balanced'))
+        ])
+        pipeline.fit([text[:LOCAL_CLASSIFIER_MAX_CHARS] for text in texts], labels)
+        return cls(pipeline)
+
+    def predict(self, text):
+        """Classify a document
+
+        Args:
+            text (str): The document text
+
+        Returns:
+            tuple: The predicted category and its probability
+        """
+        probabilities = self.pipeline.predict_proba([text[:LOCAL_CLASSIFIER_MAX_CHARS]])[0]
+        best = probabilities.argmax()
+        return str(self.pipeline.classes_[best]), float(probabilities[best])
+
+    def save(self, path=LOCAL_CLASSIFIER_MODEL):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        joblib.dump(self.pipeline, path)
+
+    @classmethod
+    def load(cls, path=LOCAL_CLASSIFIER_MODEL):
+        return cls(joblib.load(path))
+
+
+logger = logging.getLogger(__name__)
+
+_default_classifier = None
+_default_loaded = False
+_default_lock = threading.Lock()
+
+
+def load_default_classifier():
+    """Load the model at LOCAL_CLASSIFIER_MODEL once per process
+
+    Returns:
+        LocalClassifier: The trained classifier, or None if no model has been trained
+    """
+    global _default_classifier, _default_loaded
+    with _default_lock:
+        if not _default_loaded:
+            _default_loaded = True
+            if os.path.exists(LOCAL_CLASSIFIER_MODEL):
+                try:
+                    _default_classifier = LocalClassifier.load(LOCAL_CLASSIFIER_MODEL)
+                except Exception:
+                    logger.exception("Could not load local classifier from %s", LOCAL_CLASSIFIER_MODEL)
+        return _default_classifier
+
+
+def _read_document(path):
+    if path.lower().endswith('.pdf'):
+        from pdf_extract import extract_text
+        with open(path, 'rb') as f:
+            return extract_text(f.read())[0]
+    with open(path, encoding='utf-8', errors='ignore') as f:
+        return f.read()
+
+
+def load_training_data(path):
+    """Read labelled documents from a JSONL file or a directory of per-category folders
+
+    Returns:
+        tuple: Lists of texts and labels
+    """
+    from worqhat_utils import DOCUMENT_CATEGORIES
+    categories_by_slug = {_slug(category): category for category in DOCUMENT_CATEGORIES}
+    texts, labels = [], []
+
+    if os.path.isdir(path):
+        for folder in sorted(os.listdir(path)):
+            folder_path = os.path.join(path, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            label = categories_by_slug.get(_slug(folder))
+            if label is None:
+                raise ValueError(f"Folder '{folder}' does not match any document category")
+            for name in sorted(os.listdir(folder_path)):
+                if name.lower().endswith(('.pdf', '.txt')):
+                    text = _read_document(os.path.join(folder_path, name))
+                    if text.strip():
+                        texts.append(text)
+                        labels.append(label)
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                label = record['label']
+                if label not in DOCUMENT_CATEGORIES:
+                    label = categories_by_slug.get(_slug(label))
+                if label is None:
+                    raise ValueError(f"Line {line_number}: unknown label '{record['label']}'")
+                texts.append(record['text'])
+                labels.append(label)
+
+    return texts, labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train or query the local document classifier')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help='Train and save a model')
+    train_parser.add_argument('--data', required=True, help='JSONL file or directory of per-category folders')
+    train_parser.add_argument('--out', default=LOCAL_CLASSIFIER_MODEL, help='Where to write the model')
+    train_parser.add_argument('--holdout', type=float, default=0.0,
+                              help='Fraction of documents held out to report accuracy and coverage')
+
+    predict_parser = subparsers.add_parser('predict', help='Classify documents with a saved model')
+    predict_parser.add_argument('files', nargs='+')
+    predict_parser.add_argument('--model', default=LOCAL_CLASSIFIER_MODEL)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'train':
+        texts, labels = load_training_data(args.data)
+        print(f"Loaded {len(texts)} documents in {len(set(labels))} categories")
+        if args.holdout:
+            from sklearn.model_selection import train_test_split
+            train_texts, test_texts, train_labels, test_labels = train_test_split(
+                texts, labels, test_size=args.holdout, random_state=0, stratify=labels)
+            classifier = LocalClassifier.train(train_texts, train_labels)
+            predictions = [classifier.predict(text) for text in test_texts]
+            correct = sum(label == truth for (label, _), truth in zip(predictions, test_labels))
+            confident = [(label, truth) for (label, confidence), truth in zip(predictions, test_labels)
+                         if confidence >= LOCAL_CLASSIFIER_THRESHOLD]
+            confident_correct = sum(label == truth for label, truth in confident)
+            print(f"Holdout accuracy: {correct / len(test_texts):.3f}")
+            print(f"Answered locally at threshold {LOCAL_CLASSIFIER_THRESHOLD}: {len(confident) / len(test_texts):.3f} "
+                  f"(accuracy {confident_correct / max(len(confident), 1):.3f})")
+        classifier = LocalClassifier.train(texts, labels)
+        classifier.save(args.out)
+        print(f"Saved model to {args.out}")
+
+    elif args.command == 'predict':
+        classifier = LocalClassifier.load(args.model)
+        for path in args.files:
+            label, confidence = classifier.predict(_read_document(path))
+            print(f"{path}\t{label}\t{confidence:.3f}")
+
+
+if __name__ == '__main__':
+    main()
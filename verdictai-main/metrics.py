@@ -0,0 +1,200 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Histogram buckets: seconds for durations, characters for prompt and response sizes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+CHAR_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield self.name, _format_labels(self.label_names, key), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, in the Prometheus layout"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the enclosed block, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield (f'{self.name}_bucket',
+                       _format_labels(self.label_names, key, [('le', _format_value(bound))]), cumulative)
+            yield f'{self.name}_sum', _format_labels(self.label_names, key), total
+            yield f'{self.name}_count', _format_labels(self.label_names, key), count
+
+
+class Gauge:
+    """Gauge whose labelled values are read from a callback at scrape time
+
+    Args:
+        collect (callable): Returns a list of (label values tuple, value) pairs
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.collect = collect
+
+    def samples(self):
+        for key, value in (self.collect() if self.collect else []):
+            yield self.name, _format_labels(self.label_names, key), value
+
+
+class Registry:
+    """Collection of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self.metrics)
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            try:
+                for name, labels, value in metric.samples():
+                    lines.append(f'{name}{labels} {_format_value(value)}')
+            except Exception:
+                # A failing gauge callback must not break the rest of the scrape
+                continue
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    'verdictai_http_request_duration_seconds', 'Time to produce a response, per route',
+    labels=('method', 'route', 'status')))
+stage_duration = registry.register(Histogram(
+    'verdictai_stage_duration_seconds', 'Time spent in local processing stages such as PDF extraction and draft rendering',
+    labels=('stage',)))
+upstream_duration = registry.register(Histogram(
+    'verdictai_upstream_request_duration_seconds', 'Duration of WorqHat calls including retries, per client operation',
+    labels=('operation', 'outcome')))
+upstream_prompt_chars = registry.register(Histogram(
+    'verdictai_upstream_prompt_chars', 'Prompt size of WorqHat calls in characters',
+    labels=('operation',), buckets=CHAR_BUCKETS))
+upstream_response_chars = registry.register(Histogram(
+    'verdictai_upstream_response_chars', 'Generated content size of WorqHat calls in characters',
+    labels=('operation',), buckets=CHAR_BUCKETS))
+upstream_attempts = registry.register(Counter(
+    'verdictai_upstream_attempts_total', 'HTTP attempts made to WorqHat, counting retries',
+    labels=('operation',)))
+
+
+def timed(stage):
+    """Context manager timing a local processing stage"""
+    return stage_duration.time(stage=stage)
+
+
+def observe_upstream(timing):
+    """Timing listener for WorqHatClient that records each upstream call"""
+    if timing.cached:
+        outcome = 'cached'
+    elif timing.coalesced:
+        outcome = 'coalesced'
+    elif timing.error or timing.status_code != 200:
+        outcome = 'error'
+    else:
+        outcome = 'ok'
+    upstream_duration.observe(timing.elapsed, operation=timing.operation, outcome=outcome)
+    if not timing.cached and not timing.coalesced:
+        upstream_attempts.inc(timing.attempts, operation=timing.operation)
+    if timing.prompt_chars is not None:
+        upstream_prompt_chars.observe(timing.prompt_chars, operation=timing.operation)
+    if timing.response_chars is not None:
+        upstream_response_chars.observe(timing.response_chars, operation=timing.operation)
+
+
+def register_store_gauges(stores):
+    """Expose entry counts and sizes of session stores as gauges"""
+    def collect(field):
+        return lambda: [((store.name,), store.stats()[field]) for store in stores]
+
+    registry.register(Gauge('verdictai_store_entries', 'Entries held in each session store',
+                            labels=('store',), collect=collect('entries')))
+    registry.register(Gauge('verdictai_store_memory_bytes', 'Estimated in-memory size of each session store',
+                            labels=('store',), collect=collect('memory_bytes')))
+    registry.register(Gauge('verdictai_store_spilled_bytes', 'Bytes each session store has spilled to disk',
+                            labels=('store',), collect=collect('spilled_bytes')))
@@ -0,0 +1,137 @@
+"""Local stand-in for the WorqHat content API, for development and testing
+
+Run it and point the app at it:
+
+    python mock_worqhat.py --port 5055 --chunk-delay 0.05
+    WORQHAT_BASE_URL=http://127.0.0.1:5055/api/ai/content/v4 python app.py
+
+Every POST is answered with a canned reply that echoes the end of the
+prompt. Requests with "stream_data": true are answered with one JSON
+object per line, sent a few words at a time. Latency can be randomized
+with --jitter, and --error-rate makes a fraction of requests fail with
+--error-status to exercise retries and error handling.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def build_reply(question):
+    """Build a deterministic reply for a prompt"""
+    tail = ' '.join(question.split()[-12:])
+    return f"**Mock response.** This is a simulated answer from the local WorqHat stand-in. The request ended with: {tail}"
+
+
+class MockWorqHatHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # Overridden per server through make_handler
+    latency = 0.0
+    jitter = 0.0
+    chunk_delay = 0.0
+    words_per_chunk = 3
+    error_rate = 0.0
+    error_status = 500
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': 'Invalid JSON'})
+            return
+
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        if self.error_rate and random.random() < self.error_rate:
+            self._send_json(self.error_status, {'error': 'Injected mock failure'})
+            return
+
+        reply = build_reply(payload.get('question', ''))
+        try:
+            if payload.get('stream_data'):
+                self._stream(reply)
+            else:
+                self._send_json(200, {'content': reply, 'processingTime': delay * 1000})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away mid-response
+            pass
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, reply):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        words = reply.split(' ')
+        for start in range(0, len(words), self.words_per_chunk):
+            piece = ' '.join(words[start:start + self.words_per_chunk])
+            if start + self.words_per_chunk < len(words):
+                piece += ' '
+            self._write_chunk(json.dumps({'content': piece}) + '\n')
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_handler(**settings):
+    """Create a handler class with the given class-level settings"""
+    return type('ConfiguredMockWorqHatHandler', (MockWorqHatHandler,), settings)
+
+
+def start_server(host='127.0.0.1', port=0, **settings):
+    """Start the mock server on a background thread
+
+    Returns:
+        tuple: The server and the content endpoint URL to use as WORQHAT_BASE_URL
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(**settings))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{host}:{server.server_port}/api/ai/content/v4"
+    return server, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the WorqHat content API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before responding')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random latency of up to this many seconds')
+    parser.add_argument('--chunk-delay', type=float, default=0.05, help='Seconds between streamed chunks')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status used for injected errors')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(
+        latency=args.latency, jitter=args.jitter, chunk_delay=args.chunk_delay,
+        error_rate=args.error_rate, error_status=args.error_status))
+    print(f"Mock WorqHat API listening on http://{args.host}:{args.port}/api/ai/content/v4")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
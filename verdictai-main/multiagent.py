@@ -1,8 +1,112 @@
-from transformers import pipeline
+import gc
+import os
+import threading
+import time
 
-# Load HuggingFace pipelines
-qa_pipeline = pipeline("question-answering", model="distilbert-base-cased-distilled-squad")
-summarizer_pipeline = pipeline("summarization", model="t5-small", device=-1)
+from summarization import map_reduce_summarize
+
+# Seconds a pipeline may sit unused before it is unloaded; 0 keeps pipelines loaded
+MODEL_IDLE_UNLOAD_SECONDS = float(os.getenv('MODEL_IDLE_UNLOAD_SECONDS', '0'))
+
+# Batched and long-context inference settings
+AGENT_BATCH_SIZE = int(os.getenv('AGENT_BATCH_SIZE', '8'))
+QA_DOC_STRIDE = int(os.getenv('QA_DOC_STRIDE', '128'))  # Tokens shared by consecutive QA windows
+QA_MAX_SEQ_LEN = int(os.getenv('QA_MAX_SEQ_LEN', '384'))  # Tokens per QA window
+QA_MAX_CONTEXT_CHARS = int(os.getenv('QA_MAX_CONTEXT_CHARS', '200000'))
+LOCAL_SUMMARY_CHUNK_CHARS = int(os.getenv('LOCAL_SUMMARY_CHUNK_CHARS', '2000'))  # Fits t5-small's 512-token input
+
+# HuggingFace pipelines, created on first use
+PIPELINE_SPECS = {
+    "question-answering": {"task": "question-answering", "model": "distilbert-base-cased-distilled-squad"},
+    "summarization": {"task": "summarization", "model": "t5-small", "device": -1},
+}
+
+
+class PipelineRegistry:
+    """
+    Thread-safe registry that builds HuggingFace pipelines on first use.
+    Optionally unloads pipelines that have been idle for longer than idle_unload_seconds.
+    """
+    def __init__(self, specs, idle_unload_seconds=MODEL_IDLE_UNLOAD_SECONDS):
+        self.specs = specs
+        self.idle_unload_seconds = idle_unload_seconds
+        self._pipelines = {}
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in specs}
+        self._reaper = None
+
+    def get(self, name):
+        """Return the named pipeline, loading it if needed. Concurrent first calls load it once."""
+        pipe = self._pipelines.get(name)
+        if pipe is None:
+            with self._load_locks[name]:
+                pipe = self._pipelines.get(name)
+                if pipe is None:
+                    # Import here so that importing this module stays cheap
+                    from transformers import pipeline
+                    spec = dict(self.specs[name])
+                    pipe = pipeline(spec.pop("task"), **spec)
+                    with self._lock:
+                        self._pipelines[name] = pipe
+                    self._start_reaper()
+        self._last_used[name] = time.monotonic()
+        return pipe
+
+    def warm_up(self, names=None):
+        """Load pipelines ahead of the first request."""
+        for name in names or self.specs:
+            self.get(name)
+
+    def unload(self, name):
+        with self._load_locks[name]:
+            with self._lock:
+                removed = self._pipelines.pop(name, None)
+        if removed is not None:
+            # Calls already holding the pipeline keep it alive until they finish
+            del removed
+            gc.collect()
+
+    def unload_idle(self):
+        """Unload every pipeline unused for longer than idle_unload_seconds."""
+        if not self.idle_unload_seconds:
+            return
+        now = time.monotonic()
+        for name in list(self._pipelines):
+            if now - self._last_used.get(name, now) > self.idle_unload_seconds:
+                self.unload(name)
+
+    def loaded(self):
+        return list(self._pipelines)
+
+    def _start_reaper(self):
+        if not self.idle_unload_seconds or self._reaper is not None:
+            return
+
+        def reap():
+            while True:
+                time.sleep(max(self.idle_unload_seconds / 2, 1.0))
+                self.unload_idle()
+
+        self._reaper = threading.Thread(target=reap, name="pipeline-reaper", daemon=True)
+        self._reaper.start()
+
+
+pipelines = PipelineRegistry(PIPELINE_SPECS)
+
+
+def warm_up(names=None):
+    """Optional hook to load models at startup instead of on the first request."""
+    pipelines.warm_up(names)
+
+
+def __getattr__(name):
+    # Keep the old module-level pipeline names working, loading on access
+    if name == "qa_pipeline":
+        return pipelines.get("question-answering")
+    if name == "summarizer_pipeline":
+        return pipelines.get("summarization")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class Agent:
@@ -20,25 +124,94 @@ class Agent:
         - For 'qa': Answer questions using provided context
         - For 'summarization': Generate summary of the context
         """
+        return self.respond_many([query], [context])[0]
+
+    def respond_many(self, queries=None, contexts=None, batch_size=AGENT_BATCH_SIZE, return_spans=False):
+        """
+        Generate responses for many inputs, sending them through the pipeline in batches.
+        - For 'qa': queries and contexts are paired; a single context string is shared by every query.
+          Long contexts are covered with overlapping strided windows and the best-scoring span wins.
+        - For 'summarization': one summary per context; queries are ignored.
+        With return_spans, 'qa' results are dicts with the answer, its score and its
+        start/end offsets within the given context.
+        """
+        contexts = contexts if contexts is not None else [""]
+        if isinstance(contexts, str):
+            contexts = [contexts] * len(queries or [""])
+        queries = queries if queries is not None else [""] * len(contexts)
+        if len(queries) != len(contexts):
+            raise ValueError("queries and contexts must have the same length")
+
         try:
             if self.task == "qa":
-                if not context.strip():
-                    return "Sorry, I need some context to answer that."
-                full_context = f"{self.system_msg}\n{context}".strip()
-                full_context = full_context[:3500]  # Prevent overloading input
-                result = qa_pipeline(question=query.strip(), context=full_context)
-                return result.get('answer', 'Sorry, I could not find a clear answer.')
+                return self._answer_many(queries, contexts, batch_size, return_spans)
 
             elif self.task == "summarization":
-                full_input = f"{self.system_msg}\n{context}".strip()
-                result = summarizer_pipeline(full_input, max_length=512, min_length=80, do_sample=False)
-                return result[0]['summary_text']
+                inputs = [f"{self.system_msg}\n{context}".strip() for context in contexts]
+                results = pipelines.get("summarization")(
+                    inputs, batch_size=batch_size, max_length=512, min_length=80, do_sample=False, truncation=True
+                )
+                return [result['summary_text'] for result in results]
 
             else:
-                return "❌ Unsupported task type."
+                return ["❌ Unsupported task type."] * len(contexts)
 
         except Exception as e:
-            return f"⚠️ Error: {str(e)}"
+            return [f"⚠️ Error: {str(e)}"] * len(contexts)
+
+    def summarize_long(self, text, max_chars=LOCAL_SUMMARY_CHUNK_CHARS, batch_size=AGENT_BATCH_SIZE):
+        """
+        Summarize a document of any length: section-aware chunks are summarized in batches,
+        then partial summaries are merged in as few passes as the model's input size allows.
+        """
+        def summarize_many(texts):
+            return [None if summary.startswith("⚠️ Error") else summary
+                    for summary in self.respond_many(contexts=texts, batch_size=batch_size)]
+
+        def merge_many(groups):
+            return summarize_many(["\n".join(group) for group in groups])
+
+        summary = map_reduce_summarize(text, summarize_many, merge_many, max_chars=max_chars)
+        return summary if summary is not None else "⚠️ Error: could not summarize any part of the document"
+
+    def _answer_many(self, queries, contexts, batch_size, return_spans):
+        no_context = "Sorry, I need some context to answer that."
+        responses = [{'answer': no_context, 'score': 0.0, 'start': None, 'end': None} for _ in queries]
+
+        pending = [i for i, context in enumerate(contexts) if context.strip()]
+        if pending:
+            full_contexts, offsets = [], []
+            for i in pending:
+                context = contexts[i].strip()[:QA_MAX_CONTEXT_CHARS]
+                full_context = f"{self.system_msg}\n{context}".strip()
+                full_contexts.append(full_context)
+                # Position of the caller's context within the full context, minus any leading whitespace stripped from it
+                offsets.append(len(full_context) - len(context) - (len(contexts[i]) - len(contexts[i].lstrip())))
+
+            results = pipelines.get("question-answering")(
+                question=[queries[i].strip() for i in pending],
+                context=full_contexts,
+                batch_size=batch_size,
+                doc_stride=QA_DOC_STRIDE,
+                max_seq_len=QA_MAX_SEQ_LEN,
+            )
+            if isinstance(results, dict):
+                results = [results]
+
+            for i, offset, result in zip(pending, offsets, results):
+                start = result.get('start')
+                # Report offsets relative to the caller's context; spans inside the system message have none
+                in_context = start is not None and start - offset >= 0
+                responses[i] = {
+                    'answer': result.get('answer') or 'Sorry, I could not find a clear answer.',
+                    'score': float(result.get('score', 0.0)),
+                    'start': start - offset if in_context else None,
+                    'end': result['end'] - offset if in_context else None,
+                }
+
+        if return_spans:
+            return responses
+        return [response['answer'] for response in responses]
 
 # === Predefined Agents ===
 
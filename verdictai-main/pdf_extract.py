@@ -0,0 +1,145 @@
+import os
+import threading
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import PyPDF2
+
+# Extraction configuration
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '16'))
+PDF_BATCHES_PER_WORKER = 4
+
+
+class PageResult:
+    """Text extracted from one page, or the error that page raised"""
+
+    def __init__(self, index, text='', error=None):
+        self.index = index
+        self.text = text
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _extract_range(pdf_bytes, start, stop):
+    """Extract pages [start, stop) of a PDF; runs inside a worker process
+
+    Returns plain tuples so results pickle cheaply back to the parent.
+    """
+    reader = PyPDF2.PdfReader(BytesIO(pdf_bytes))
+    results = []
+    for index in range(start, stop):
+        try:
+            results.append((index, reader.pages[index].extract_text() or '', None))
+        except Exception as e:
+            results.append((index, '', str(e)))
+    return results
+
+
+def page_count(pdf_bytes):
+    """Return the number of pages in a PDF"""
+    return len(PyPDF2.PdfReader(BytesIO(pdf_bytes)).pages)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS)
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _batches(total, workers):
+    """Split page indices into contiguous ranges, a few per worker for load balancing"""
+    size = max(1, -(-total // (workers * PDF_BATCHES_PER_WORKER)))
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+def iter_pages(pdf_bytes, workers=None):
+    """Extract PDF pages, yielding each page as soon as its batch finishes
+
+    Small documents are extracted in-process; larger ones are split across a
+    shared process pool. Pages are yielded in completion order, not page
+    order. A page that fails to extract is yielded with its error instead of
+    aborting the document.
+
+    Args:
+        pdf_bytes (bytes): The raw PDF file content
+        workers (int): Number of worker processes, defaults to PDF_EXTRACT_WORKERS
+
+    Yields:
+        PageResult: One result per page
+    """
+    total = page_count(pdf_bytes)
+    workers = workers or PDF_EXTRACT_WORKERS
+
+    if total < PDF_PARALLEL_MIN_PAGES or workers <= 1:
+        for index, text, error in _extract_range(pdf_bytes, 0, total):
+            yield PageResult(index, text, error)
+        return
+
+    pending = {}
+    try:
+        pool = _get_pool()
+        pending = {pool.submit(_extract_range, pdf_bytes, start, stop): (start, stop)
+                   for start, stop in _batches(total, workers)}
+        for future in as_completed(list(pending)):
+            start, stop = pending[future]
+            try:
+                results = future.result()
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                results = [(index, '', str(e)) for index in range(start, stop)]
+            del pending[future]
+            for index, text, error in results:
+                yield PageResult(index, text, error)
+    except BrokenProcessPool:
+        # A worker died; finish the remaining pages in-process with a fresh pool next time
+        _reset_pool()
+        for start, stop in pending.values():
+            for index, text, error in _extract_range(pdf_bytes, start, stop):
+                yield PageResult(index, text, error)
+
+
+def extract_pages(pdf_bytes, workers=None):
+    """Extract every page of a PDF
+
+    Args:
+        pdf_bytes (bytes): The raw PDF file content
+        workers (int): Number of worker processes, defaults to PDF_EXTRACT_WORKERS
+
+    Returns:
+        list: One PageResult per page, in page order
+    """
+    return sorted(iter_pages(pdf_bytes, workers), key=lambda page: page.index)
+
+
+def extract_text(pdf_bytes, workers=None):
+    """Extract the full text of a PDF
+
+    Args:
+        pdf_bytes (bytes): The raw PDF file content
+        workers (int): Number of worker processes, defaults to PDF_EXTRACT_WORKERS
+
+    Returns:
+        tuple: The joined text of all pages and the list of pages that failed
+    """
+    pages = extract_pages(pdf_bytes, workers)
+    return ''.join(page.text for page in pages), [page for page in pages if not page.ok]
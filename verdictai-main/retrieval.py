@@ -0,0 +1,116 @@
+import os
+import re
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Retrieval configuration
+RETRIEVAL_CHUNK_CHARS = int(os.getenv('RETRIEVAL_CHUNK_CHARS', '800'))
+RETRIEVAL_CHUNK_OVERLAP = int(os.getenv('RETRIEVAL_CHUNK_OVERLAP', '150'))
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '6'))
+
+_BREAKS = re.compile(r'\n\s*\n|(?<=[.;:])\s+|\n')
+
+
+def split_chunks(text, chunk_chars=RETRIEVAL_CHUNK_CHARS, overlap=RETRIEVAL_CHUNK_OVERLAP):
+    """Split text into overlapping chunks, preferring paragraph and sentence boundaries
+
+    Args:
+        text (str): The document text
+        chunk_chars (int): Target chunk length in characters
+        overlap (int): Characters shared between consecutive chunks
+
+    Returns:
+        list: (start offset, chunk text) tuples in document order
+    """
+    chunks = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_chars, length)
+        if end < length:
+            # Cut at the last natural break in the second half of the window
+            window = text[start + chunk_chars // 2:end]
+            breaks = [match.end() for match in _BREAKS.finditer(window)]
+            if breaks:
+                end = start + chunk_chars // 2 + breaks[-1]
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append((start, chunk))
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+class ChunkIndex:
+    """TF-IDF index over the chunks of one document, built once at ingest
+
+    Args:
+        text (str): The document text
+        chunk_chars (int): Target chunk length in characters
+        overlap (int): Characters shared between consecutive chunks
+    """
+
+    def __init__(self, text, chunk_chars=RETRIEVAL_CHUNK_CHARS, overlap=RETRIEVAL_CHUNK_OVERLAP):
+        self.text_length = len(text)
+        self.chunks = split_chunks(text, chunk_chars, overlap)
+        self.vectorizer = TfidfVectorizer(stop_words='english', sublinear_tf=True, ngram_range=(1, 2))
+        try:
+            self.matrix = self.vectorizer.fit_transform([chunk for _, chunk in self.chunks])
+        except ValueError:
+            # Empty vocabulary, e.g. a document made only of stop words or numbers
+            self.matrix = None
+
+    def top_passages(self, query, k=RETRIEVAL_TOP_K, max_chars=3000):
+        """Select the chunks most relevant to a query within a size budget
+
+        Chunks are chosen by descending similarity and returned in document
+        order. When nothing matches, the opening chunks are returned so the
+        result degrades to the old fixed prefix.
+
+        Args:
+            query (str): The user's question or instructions
+            k (int): Maximum number of chunks to return
+            max_chars (int): Budget for the combined chunk text
+
+        Returns:
+            list: (start offset, chunk text) tuples in document order
+        """
+        order = range(len(self.chunks))
+        if self.matrix is not None and query.strip():
+            scores = (self.matrix @ self.vectorizer.transform([query]).T).toarray().ravel()
+            if scores.max() > 0:
+                order = [int(i) for i in np.argsort(-scores, kind='stable') if scores[i] > 0]
+
+        selected = []
+        used = 0
+        for index in order:
+            start, chunk = self.chunks[index]
+            if used + len(chunk) > max_chars:
+                if not selected:
+                    selected.append((start, chunk[:max_chars]))
+                continue
+            selected.append((start, chunk))
+            used += len(chunk)
+            if len(selected) >= k:
+                break
+        return sorted(selected)
+
+    def context_for(self, query, max_chars=3000, k=RETRIEVAL_TOP_K):
+        """Join the passages relevant to a query into a prompt-ready excerpt"""
+        return '\n...\n'.join(chunk for _, chunk in self.top_passages(query, k, max_chars))
+
+    def estimated_size(self):
+        matrix_bytes = 0
+        if self.matrix is not None:
+            matrix_bytes = self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+        vocabulary_bytes = sum(len(term) + 16 for term in self.vectorizer.vocabulary_) if self.matrix is not None else 0
+        return sum(len(chunk) for _, chunk in self.chunks) + matrix_bytes + vocabulary_bytes
+
+
+def build_index(text, max_chars=3000):
+    """Build a chunk index for a document, or None if it already fits in one prompt excerpt"""
+    if len(text) <= max_chars:
+        return None
+    return ChunkIndex(text)
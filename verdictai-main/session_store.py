@@ -0,0 +1,491 @@
+import atexit
+import os
+import pickle
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Store configuration
+SESSION_STORE_MAX_BYTES = int(os.getenv('SESSION_STORE_MAX_BYTES', str(512 * 1024 * 1024)))
+SESSION_STORE_SPILL_BYTES = int(os.getenv('SESSION_STORE_SPILL_BYTES', str(1024 * 1024)))
+SESSION_STORE_SPILL_DIR = os.getenv('SESSION_STORE_SPILL_DIR', '')
+
+# State backend: 'memory' keeps stores in this process; 'sqlite' shares them between worker processes
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory').lower()
+STATE_SQLITE_PATH = os.getenv('STATE_SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'state.sqlite3'))
+STATE_SQLITE_MAX_BYTES = int(os.getenv('STATE_SQLITE_MAX_BYTES', str(4 * 1024 * 1024 * 1024)))
+
+
+def estimate_size(value):
+    """Cheap estimate of the memory held by a stored value, in bytes"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) for item in value)
+    if hasattr(value, 'estimated_size'):
+        return value.estimated_size()
+    return sys.getsizeof(value)
+
+
+class StoreBudget:
+    """Memory budget shared by several stores, evicting the least recently used entry across all of them"""
+
+    def __init__(self, max_bytes=SESSION_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.lock = threading.RLock()
+        self.stores = []
+
+    def register(self, store):
+        with self.lock:
+            self.stores.append(store)
+
+    def enforce(self):
+        """Evict globally least recently used entries until usage fits the budget"""
+        with self.lock:
+            while self.used_bytes > self.max_bytes:
+                candidates = [(store, store._oldest_in_memory()) for store in self.stores]
+                candidates = [(store, key) for store, key in candidates if key is not None]
+                if not candidates:
+                    break
+                store, key = min(candidates, key=lambda candidate: candidate[0]._entries[candidate[1]].last_access)
+                store._remove(key, 'evictions')
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'ttl', 'expires_at', 'last_access', 'spill_path')
+
+    def __init__(self, value, size, ttl, spill_path=None):
+        self.value = value
+        self.size = size
+        self.ttl = ttl
+        self.spill_path = spill_path
+        self.touch()
+
+    def touch(self):
+        self.last_access = time.monotonic()
+        self.expires_at = self.last_access + self.ttl if self.ttl is not None else None
+
+
+class BoundedStore:
+    """Dict-like store with idle TTL expiry, LRU eviction under a byte budget and disk spill for large blobs
+
+    An entry expires once it has gone unread for its time-to-live.
+    Byte values larger than `spill_bytes` are written to a spill directory
+    and only their path is kept in memory. `on_evict(key, value)` is called
+    whenever a value leaves the store, so callers can release resources
+    such as files the value refers to.
+
+    Args:
+        name (str): Name used in metrics
+        ttl (float): Default time-to-live of an entry in seconds, or None for no expiry
+        budget (StoreBudget): Shared memory budget; a private one is created when omitted
+        spill_bytes (int): Byte values larger than this are spilled to disk, or None to never spill
+        on_evict (callable): Called with (key, value) when an entry is removed
+    """
+
+    def __init__(self, name, ttl=None, budget=None, spill_bytes=None, on_evict=None):
+        self.name = name
+        self.ttl = ttl
+        self.budget = budget if budget is not None else StoreBudget()
+        self.spill_bytes = spill_bytes
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'spills': 0}
+        self.spilled_bytes = 0
+        self.budget.register(self)
+
+    # Internal helpers; callers hold self.budget.lock
+
+    def _oldest_in_memory(self):
+        """Key of the least recently used entry held in memory; spilled entries do not count against the budget"""
+        for key, entry in self._entries.items():
+            if not entry.spill_path:
+                return key
+        return None
+
+    def _remove(self, key, reason=None):
+        entry = self._entries.pop(key)
+        value = None
+        if entry.spill_path:
+            self.spilled_bytes -= entry.size
+            if self.on_evict is not None:
+                value = _read_spill(entry.spill_path)
+            _remove_file(entry.spill_path)
+        else:
+            self.budget.used_bytes -= entry.size
+            value = entry.value
+        if reason:
+            self._stats[reason] += 1
+        if self.on_evict is not None:
+            try:
+                self.on_evict(key, value)
+            except Exception:
+                pass
+        return entry
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            self._remove(key, 'expirations')
+            return None
+        return entry
+
+    # Public API
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        spill_path = None
+        if (self.spill_bytes is not None and isinstance(value, (bytes, bytearray))
+                and len(value) > self.spill_bytes):
+            spill_path = _write_spill(value)
+
+        with self.budget.lock:
+            if key in self._entries:
+                self._remove(key)
+            if spill_path:
+                entry = _Entry(None, len(value), ttl, spill_path)
+                self.spilled_bytes += entry.size
+                self._stats['spills'] += 1
+            else:
+                entry = _Entry(value, estimate_size(value), ttl)
+                self.budget.used_bytes += entry.size
+            self._entries[key] = entry
+            self.budget.enforce()
+
+    def get(self, key, default=None):
+        with self.budget.lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+            value = entry.value
+            if entry.spill_path:
+                # Read under the lock, so a concurrent eviction cannot remove the file first
+                value = _read_spill(entry.spill_path)
+                if value is None:
+                    self._remove(key)
+                    self._stats['misses'] += 1
+                    return default
+            self._stats['hits'] += 1
+            entry.touch()
+            self._entries.move_to_end(key)
+            return value
+
+    def delete(self, key):
+        with self.budget.lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self.delete(key)
+        return value
+
+    def purge_expired(self):
+        """Remove every expired entry and return how many were removed"""
+        now = time.monotonic()
+        with self.budget.lock:
+            expired = [key for key, entry in self._entries.items()
+                       if entry.expires_at is not None and entry.expires_at <= now]
+            for key in expired:
+                self._remove(key, 'expirations')
+        return len(expired)
+
+    def clear(self):
+        with self.budget.lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        """Return size and eviction metrics for this store"""
+        with self.budget.lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['memory_bytes'] = sum(entry.size for entry in self._entries.values() if not entry.spill_path)
+            stats['spilled_bytes'] = self.spilled_bytes
+            stats['budget_used_bytes'] = self.budget.used_bytes
+            stats['budget_max_bytes'] = self.budget.max_bytes
+        return stats
+
+    def __contains__(self, key):
+        with self.budget.lock:
+            return self._live_entry(key) is not None
+
+    def __getitem__(self, key):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        with self.budget.lock:
+            if key not in self._entries:
+                raise KeyError(key)
+            self._remove(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """Dict-like store kept in a SQLite database in WAL mode, shared by every process that opens the same file
+
+    Offers the same interface as BoundedStore, so the app can run under
+    several worker processes and still find a user's documents, drafts and
+    chat history whichever worker serves the request. Values are pickled,
+    so a value read back is a copy: changes to it must be written back
+    with `store[key] = value`. Entries expire after going unread for their
+    time-to-live, and when the database outgrows `max_bytes` the least
+    recently used entries of all stores in it are evicted.
+
+    Args:
+        name (str): Name of the store; stores sharing a database are kept apart by name
+        ttl (float): Default time-to-live of an entry in seconds, or None for no expiry
+        path (str): Database file, shared by all worker processes
+        max_bytes (int): Size budget shared by all stores in the database
+    """
+
+    # Reads refresh an entry's expiry at most this often, so hot keys do not write on every read
+    TOUCH_INTERVAL = 30.0
+    # Sets between checks of the size budget
+    ENFORCE_EVERY = 32
+
+    def __init__(self, name, ttl=None, path=STATE_SQLITE_PATH, max_bytes=STATE_SQLITE_MAX_BYTES):
+        self.name = name
+        self.ttl = ttl
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+        self._sets = 0
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS state (store TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, expires_at REAL, accessed_at REAL NOT NULL, PRIMARY KEY (store, key))"
+        )
+        self._connect().execute("CREATE INDEX IF NOT EXISTS state_accessed ON state (accessed_at)")
+
+    def _connect(self):
+        # One connection per thread, reopened in a forked worker rather than shared with its parent
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _expiry(self, ttl, now):
+        return now + ttl if ttl is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO state (store, key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (self.name, key, data, len(data), self._expiry(ttl, now), now)
+        )
+        with self._lock:
+            self._sets += 1
+            enforce = self._sets % self.ENFORCE_EVERY == 0
+        if enforce:
+            self.enforce()
+
+    def get(self, key, default=None):
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM state WHERE store = ? AND key = ?", (self.name, key)
+        ).fetchone()
+        if row is not None and row[1] is not None and row[1] <= now:
+            conn.execute("DELETE FROM state WHERE store = ? AND key = ? AND expires_at <= ?", (self.name, key, now))
+            self._count('expirations')
+            row = None
+        if row is None:
+            self._count('misses')
+            return default
+        self._count('hits')
+        data, expires_at, accessed_at = row
+        if now - accessed_at > self.TOUCH_INTERVAL:
+            ttl = expires_at - accessed_at if expires_at is not None else None
+            conn.execute("UPDATE state SET accessed_at = ?, expires_at = ? WHERE store = ? AND key = ?",
+                         (now, self._expiry(ttl, now), self.name, key))
+        return pickle.loads(data)
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM state WHERE store = ? AND key = ?", (self.name, key))
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self.delete(key)
+        return value
+
+    def purge_expired(self):
+        """Remove every expired entry and return how many were removed"""
+        cursor = self._connect().execute(
+            "DELETE FROM state WHERE store = ? AND expires_at <= ?", (self.name, time.time())
+        )
+        self._count('expirations', cursor.rowcount)
+        return cursor.rowcount
+
+    def enforce(self):
+        """Evict least recently used entries of any store until the database fits its budget"""
+        conn = self._connect()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM state").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        evicted = 0
+        for store, key, size in conn.execute("SELECT store, key, size FROM state ORDER BY accessed_at").fetchall():
+            if excess <= 0:
+                break
+            conn.execute("DELETE FROM state WHERE store = ? AND key = ?", (store, key))
+            excess -= size
+            evicted += 1
+        self._count('evictions', evicted)
+
+    def clear(self):
+        self._connect().execute("DELETE FROM state WHERE store = ?", (self.name,))
+
+    def stats(self):
+        """Return size and eviction metrics for this store; counters are per process, sizes are shared"""
+        entries, stored_bytes = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM state WHERE store = ?", (self.name,)
+        ).fetchone()
+        with self._lock:
+            stats = dict(self._stats)
+        stats['entries'] = entries
+        stats['memory_bytes'] = 0
+        stats['spilled_bytes'] = stored_bytes
+        stats['budget_max_bytes'] = self.max_bytes
+        return stats
+
+    def __contains__(self, key):
+        row = self._connect().execute(
+            "SELECT expires_at FROM state WHERE store = ? AND key = ?", (self.name, key)
+        ).fetchone()
+        return row is not None and (row[0] is None or row[0] > time.time())
+
+    def __getitem__(self, key):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        cursor = self._connect().execute("DELETE FROM state WHERE store = ? AND key = ?", (self.name, key))
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM state WHERE store = ?", (self.name,)).fetchone()[0]
+
+
+def create_store(name, ttl=None, budget=None, spill_bytes=None, backend=None):
+    """Create a session store on the configured state backend
+
+    With the 'memory' backend this is a BoundedStore sharing `budget` and
+    spilling large blobs past `spill_bytes`; with 'sqlite' the store lives
+    in STATE_SQLITE_PATH and is shared by every worker process.
+
+    Args:
+        name (str): Store name, used in metrics and as its namespace in a shared database
+        ttl (float): Default time-to-live of an entry in seconds
+        budget (StoreBudget): Memory budget, used by the memory backend
+        spill_bytes (int): Spill threshold for byte values, used by the memory backend
+        backend (str): 'memory' or 'sqlite' (default: STATE_BACKEND)
+
+    Raises:
+        ValueError: If the backend is not known
+    """
+    backend = (backend or STATE_BACKEND).lower()
+    if backend == 'memory':
+        return BoundedStore(name, ttl=ttl, budget=budget, spill_bytes=spill_bytes)
+    if backend == 'sqlite':
+        return SQLiteStore(name, ttl=ttl)
+    raise ValueError(f"Unknown state backend: {backend}")
+
+
+_spill_dir = None
+_spill_dir_lock = threading.Lock()
+
+
+def _get_spill_dir():
+    global _spill_dir
+    with _spill_dir_lock:
+        if _spill_dir is None:
+            if SESSION_STORE_SPILL_DIR:
+                os.makedirs(SESSION_STORE_SPILL_DIR, exist_ok=True)
+                _spill_dir = tempfile.mkdtemp(prefix='spill-', dir=SESSION_STORE_SPILL_DIR)
+            else:
+                _spill_dir = tempfile.mkdtemp(prefix='verdictai-spill-')
+            atexit.register(shutil.rmtree, _spill_dir, True)
+        return _spill_dir
+
+
+def _write_spill(data):
+    path = os.path.join(_get_spill_dir(), uuid.uuid4().hex)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _read_spill(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def start_sweeper(stores, interval=60.0):
+    """Purge expired entries from the given stores periodically on a daemon thread
+
+    Without this, an expired entry that is never read again would only be
+    released by budget pressure.
+    """
+    def sweep():
+        while True:
+            time.sleep(interval)
+            for store in stores:
+                try:
+                    store.purge_expired()
+                except Exception:
+                    pass
+
+    thread = threading.Thread(target=sweep, name='session-store-sweeper', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,117 @@
+import os
+import re
+
+# Map-reduce summarization configuration
+SUMMARY_CHUNK_CHARS = int(os.getenv('SUMMARY_CHUNK_CHARS', '12000'))
+SUMMARY_MERGE_FAN_IN = int(os.getenv('SUMMARY_MERGE_FAN_IN', '6'))
+
+# Lines that start a new section: numbered clauses, ARTICLE/SECTION/CLAUSE/SCHEDULE headings,
+# roman numerals, and short all-caps headings such as "JUDGMENT" or "TERMS AND CONDITIONS"
+_HEADING = re.compile(
+    r'^\s*(?:'
+    r'(?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause|SCHEDULE|Schedule|PART|Part|CHAPTER|Chapter)\s+[\w.]+'
+    r'|\d+(?:\.\d+)*[.)]\s+\S'
+    r'|[IVXLC]+[.)]\s+\S'
+    r'|[A-Z][A-Z &/,\-]{3,60}:?\s*$'
+    r')'
+)
+
+
+def _split_long(text, max_chars):
+    """Split an oversized section at paragraph, then sentence, then hard boundaries"""
+    for separator in ('\n\n', '\n', '. '):
+        parts = text.split(separator)
+        if all(len(part) <= max_chars for part in parts):
+            return _pack(parts, max_chars, separator)
+    return [text[start:start + max_chars] for start in range(0, len(text), max_chars)]
+
+
+def _pack(parts, max_chars, separator):
+    """Greedily join consecutive parts into chunks of at most max_chars"""
+    chunks = []
+    current = ''
+    for part in parts:
+        candidate = f"{current}{separator}{part}" if current else part
+        if len(candidate) <= max_chars:
+            current = candidate
+        else:
+            if current:
+                chunks.append(current)
+            current = part
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_sections(text, max_chars=SUMMARY_CHUNK_CHARS):
+    """Split a document into chunks of at most max_chars that follow its section structure
+
+    Sections are detected from heading lines; consecutive small sections are
+    packed into one chunk and oversized sections are split further.
+
+    Args:
+        text (str): The document text
+        max_chars (int): Maximum chunk length in characters
+
+    Returns:
+        list: Chunk texts in document order
+    """
+    sections = []
+    current = []
+    for line in text.splitlines():
+        if _HEADING.match(line) and current:
+            sections.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append('\n'.join(current))
+
+    parts = []
+    for section in sections:
+        if len(section) > max_chars:
+            parts.extend(_split_long(section, max_chars))
+        elif section.strip():
+            parts.append(section)
+    return [chunk for chunk in _pack(parts, max_chars, '\n') if chunk.strip()]
+
+
+def map_reduce_summarize(text, summarize_many, merge_many, max_chars=SUMMARY_CHUNK_CHARS,
+                         fan_in=SUMMARY_MERGE_FAN_IN):
+    """Summarize a long document by summarizing its chunks together and merging the results
+
+    A document that fits in one chunk is summarized directly. Otherwise every
+    chunk is summarized in one batch, and partial summaries are merged in
+    groups of at most `fan_in` (and at most `max_chars`) per pass until one
+    summary remains.
+
+    Args:
+        text (str): The document text
+        summarize_many (callable): Takes a list of texts, returns their summaries in order.
+            Failed items may be returned as None and are skipped.
+        merge_many (callable): Takes a list of groups of partial summaries, returns one merged summary per group
+        max_chars (int): Maximum chunk length in characters
+        fan_in (int): Maximum number of partial summaries merged in one call
+
+    Returns:
+        str: The document summary, or None if every chunk failed
+    """
+    if len(text) <= max_chars:
+        return summarize_many([text])[0]
+
+    partials = [summary for summary in summarize_many(split_sections(text, max_chars)) if summary]
+    while len(partials) > 1:
+        groups = []
+        for summary in partials:
+            if (groups and len(groups[-1]) < fan_in
+                    and sum(len(s) for s in groups[-1]) + len(summary) <= max_chars):
+                groups[-1].append(summary)
+            else:
+                groups.append([summary])
+        if len(groups) == len(partials) and len(groups) > 1:
+            # Summaries too long to pair up; merge adjacent pairs anyway so the loop terminates
+            groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+        to_merge = [group for group in groups if len(group) > 1]
+        merged = iter(merge_many(to_merge))
+        partials = [next(merged) if len(group) > 1 else group[0] for group in groups]
+        partials = [summary for summary in partials if summary]
+    return partials[0] if partials else None
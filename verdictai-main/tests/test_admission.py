@@ -0,0 +1,90 @@
+import io
+
+import pytest
+import requests
+
+from worqhat_utils import AdmissionController, AIMDLimiter, CircuitBreaker, TokenBucket, UpstreamUnavailable, WorqHatClient
+
+
+class FailingSession:
+    """Stands in for requests.Session, failing every POST with the given exception"""
+
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def post(self, *args, **kwargs):
+        self.calls += 1
+        raise self.error
+
+
+class StatusSession:
+    """Stands in for requests.Session, answering every POST with the given status code"""
+
+    def __init__(self, status):
+        self.status = status
+        self.calls = 0
+
+    def post(self, *args, **kwargs):
+        self.calls += 1
+        response = requests.Response()
+        response.status_code = self.status
+        response.raw = io.BytesIO(b'{"error": "upstream failure"}')
+        return response
+
+
+def make_client(error, breaker=None, max_retries=0):
+    admission = AdmissionController(bucket=TokenBucket(rate=0), limiter=AIMDLimiter(2, 3),
+                                    breaker=breaker or CircuitBreaker(failure_threshold=100), timeout=0.1)
+    client = WorqHatClient(max_retries=max_retries, cache=None, coalesce=False, admission=admission)
+    client.session = FailingSession(error)
+    return client
+
+
+@pytest.mark.parametrize('error', [requests.exceptions.ChunkedEncodingError('truncated body'),
+                                   requests.exceptions.ContentDecodingError('bad gzip'),
+                                   requests.exceptions.TooManyRedirects('loop')])
+def test_unexpected_transport_errors_release_the_admission_slot(error):
+    client = make_client(error)
+    for _ in range(5):
+        with pytest.raises(type(error)):
+            client._post({'question': 'q'}, 'test')
+    assert client.session.calls == 5
+    assert client.admission.limiter.in_flight == 0
+
+
+def test_failed_half_open_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record_failure()
+    client = make_client(requests.exceptions.ChunkedEncodingError('truncated body'), breaker)
+
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client._post({'question': 'q'}, 'test')
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker._probe_in_flight
+    assert client.admission.limiter.in_flight == 0
+
+
+def test_connection_errors_become_upstream_unavailable():
+    client = make_client(requests.exceptions.ConnectionError('refused'))
+    with pytest.raises(UpstreamUnavailable):
+        client._post({'question': 'q'}, 'test')
+    assert client.admission.limiter.in_flight == 0
+
+
+@pytest.mark.parametrize('status', [429, 500, 502, 503, 504])
+def test_retryable_statuses_become_upstream_unavailable_once_retries_are_exhausted(status, monkeypatch):
+    monkeypatch.setattr('worqhat_utils.time.sleep', lambda seconds: None)
+    client = make_client(None, max_retries=2)
+    client.session = StatusSession(status)
+    with pytest.raises(UpstreamUnavailable):
+        client.generate_text('q', use_cache=False)
+    assert client.session.calls == 3
+    assert client.admission.limiter.in_flight == 0
+
+
+def test_client_errors_are_returned_to_the_caller():
+    client = make_client(None)
+    client.session = StatusSession(400)
+    assert client.generate_text('q', use_cache=False).startswith('Error: 400')
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+import analyze_directory
+
+
+def write_checkpoint(path, entries):
+    with open(path, 'w', encoding='utf-8') as f:
+        for name, offset in entries:
+            f.write(json.dumps({'path': name, 'offset': offset}) + '\n')
+
+
+def test_output_without_a_checkpoint_is_left_alone(tmp_path):
+    (tmp_path / 'docs').mkdir()
+    out = tmp_path / 'results.jsonl'
+    out.write_text('{"path": "a.pdf"}\n')
+    with pytest.raises(SystemExit):
+        analyze_directory.main([str(tmp_path / 'docs'), '--out', str(out)])
+    assert out.read_text() == '{"path": "a.pdf"}\n'
+
+
+def test_output_past_the_last_checkpoint_entry_is_dropped(tmp_path):
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    (docs / 'a.pdf').write_bytes(b'%PDF')
+    out = tmp_path / 'results.jsonl'
+    finished = '{"path": "a.pdf"}\n'
+    out.write_text(finished + '{"path": "b.pdf", "partial')
+    write_checkpoint(f"{out}.checkpoint", [('a.pdf', len(finished))])
+    analyze_directory.main([str(docs), '--out', str(out)])
+    assert out.read_text() == finished
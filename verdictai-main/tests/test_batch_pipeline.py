@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+from batch_pipeline import Stage, StagePipeline
+
+
+def fail(record):
+    raise ValueError('bad document')
+
+
+def test_failed_records_carry_their_stage_timing():
+    pipeline = StagePipeline([Stage('ok', lambda record: None, 2), Stage('fail', fail, 2)])
+    for record in pipeline.run({'index': index} for index in range(10)):
+        assert set(record['timings']) == {'ok', 'fail'}
+        assert record['failed_stage'] == 'fail'
+        assert record['error'] == 'bad document'
+
+
+def test_records_in_flight_are_capped_while_a_later_stage_is_slow():
+    read = []
+
+    def records():
+        for index in range(50):
+            read.append(index)
+            yield {'index': index}
+
+    def slow(record):
+        time.sleep(0.01)
+
+    pipeline = StagePipeline([Stage('fast', lambda record: None, 4), Stage('slow', slow, 1)], max_in_flight=5)
+    for finished, record in enumerate(pipeline.run(records()), start=1):
+        assert len(read) - finished <= 5
+    assert finished == 50
+
+
+def test_errors_reading_the_records_are_raised_after_the_fed_records_finish():
+    def records():
+        yield {'index': 0}
+        raise OSError('archive unreadable')
+
+    results = []
+    with pytest.raises(OSError):
+        for record in StagePipeline([Stage('ok', lambda record: None, 1)]).run(records()):
+            results.append(record)
+    assert [record['index'] for record in results] == [0]
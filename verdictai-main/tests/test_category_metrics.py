@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from category_metrics import CATEGORY_METRICS, build_metrics_prompt, coerce_metric, extract_category_metrics, parse_metrics
+
+NOTICE = CATEGORY_METRICS['Legal Notice']
+COMPLETE = {
+    'Severity Score': {'score': 7, 'reason': 'Payment is overdue.'},
+    'Violations & Broken Rules': ['Late payment'],
+    'Legal Consequences': 'A suit may be filed.',
+    'Actionable Steps': ['Pay the dues'],
+    'Urgency Detection': {'level': 'High', 'reason': 'Fifteen days to respond.'},
+    'Tone Analysis': 'Formal and firm.',
+    'Recommended Actions': ['Consult a lawyer'],
+}
+
+
+def test_values_are_converted_to_their_metric_types():
+    assert coerce_metric('Severity Score', '7.6') == {'score': 8, 'reason': ''}
+    assert coerce_metric('Urgency Detection', {'level': 'HIGH', 'explanation': 'Soon.'}) == {'level': 'high',
+                                                                                           'reason': 'Soon.'}
+    assert coerce_metric('Actionable Steps', "- Pay\n- Reply\n") == ['Pay', 'Reply']
+    assert coerce_metric('Tone Analysis', ['Formal.', 'Firm.']) == 'Formal.\nFirm.'
+
+
+@pytest.mark.parametrize('metric, value', [('Severity Score', 12), ('Severity Score', 'severe'),
+                                           ('Urgency Detection', 'soon'), ('Actionable Steps', 5),
+                                           ('Tone Analysis', '  '), ('Tone Analysis', None)])
+def test_invalid_values_are_rejected(metric, value):
+    with pytest.raises(ValueError):
+        coerce_metric(metric, value)
+
+
+def test_the_prompt_asks_for_each_metric_in_its_layout():
+    prompt = build_metrics_prompt('Legal Notice', ['Severity Score', 'Tone Analysis'], 'Pay within 15 days.')
+    assert '"Severity Score": {"score": <integer 1-10' in prompt
+    assert '"Tone Analysis": "<a few sentences>"' in prompt
+    assert 'Urgency Detection' not in prompt
+    assert prompt.rstrip().endswith('Pay within 15 days.')
+
+
+def test_keys_are_matched_ignoring_case_and_punctuation():
+    response = 'Here is the analysis:\n```json\n{"severity_score": {"score": 4}, "tone analysis": "Calm."}\n```'
+    values, problems = parse_metrics(response, ['Severity Score', 'Tone Analysis', 'Legal Consequences'])
+    assert values == {'Severity Score': {'score': 4, 'reason': ''}, 'Tone Analysis': 'Calm.'}
+    assert problems == {'Legal Consequences': 'Legal Consequences is missing'}
+
+
+def test_a_response_without_json_fails_every_metric():
+    values, problems = parse_metrics('I cannot help with that.', ['Tone Analysis'])
+    assert values == {}
+    assert set(problems) == {'Tone Analysis'}
+
+
+def test_all_metrics_come_from_one_call():
+    prompts = []
+
+    def generate(prompt, attempt):
+        prompts.append(prompt)
+        return json.dumps(COMPLETE)
+
+    report = extract_category_metrics('Legal Notice', 'text', generate=generate)
+    assert report['calls'] == 1 and len(prompts) == 1
+    assert report['missing'] == [] and report['problems'] == {}
+    assert report['metrics']['Urgency Detection'] == {'level': 'high', 'reason': 'Fifteen days to respond.'}
+    assert list(report['metrics']) == NOTICE
+
+
+def test_only_missing_or_invalid_metrics_are_asked_for_again():
+    first = dict(COMPLETE, **{'Severity Score': 11})
+    del first['Tone Analysis']
+    calls = []
+
+    def generate(prompt, attempt):
+        calls.append((prompt, attempt))
+        return json.dumps(first if attempt == 0 else {'Severity Score': 6, 'Tone Analysis': 'Firm.'})
+
+    report = extract_category_metrics('Legal Notice', 'text', retries=1, generate=generate)
+    retry_prompt = calls[1][0]
+    assert [attempt for _, attempt in calls] == [0, 1]
+    assert '"Severity Score"' in retry_prompt and '"Tone Analysis"' in retry_prompt
+    assert '"Legal Consequences"' not in retry_prompt
+    assert report['metrics']['Severity Score'] == {'score': 6, 'reason': ''}
+    assert report['missing'] == []
+
+
+def test_metrics_still_missing_after_the_retries_are_reported():
+    report = extract_category_metrics('Legal Notice', 'text', retries=1, generate=lambda prompt, attempt: '{}')
+    assert report['calls'] == 2
+    assert report['missing'] == NOTICE
+    assert report['metrics']['Tone Analysis'] is None
+    assert report['problems']['Tone Analysis'] == 'Tone Analysis is missing'
+
+
+def test_valid_metrics_of_a_previous_report_are_kept():
+    previous = {'metrics': dict(COMPLETE, **{'Tone Analysis': None})}
+    prompts = []
+
+    def generate(prompt, attempt):
+        prompts.append(prompt)
+        return '{"Tone Analysis": "Firm."}'
+
+    report = extract_category_metrics('Legal Notice', 'text', previous=previous, generate=generate)
+    assert len(prompts) == 1 and '"Severity Score"' not in prompts[0]
+    assert report['metrics']['Tone Analysis'] == 'Firm.'
+    assert report['missing'] == []
+
+    assert extract_category_metrics('Legal Notice', 'text', previous=report, generate=generate)['calls'] == 0
+
+
+def test_unknown_categories_are_rejected():
+    with pytest.raises(KeyError):
+        extract_category_metrics('Recipes', 'text', generate=lambda prompt, attempt: '{}')
@@ -0,0 +1,59 @@
+import pickle
+
+from conversation_memory import ConversationMemory, compact_turn
+
+
+def add_turns(memory, count):
+    for index in range(count):
+        memory.add_turn(f"Question {index}? With some detail.", f"Answer {index}. " + "More text. " * 10)
+
+
+def test_short_histories_are_kept_verbatim():
+    memory = ConversationMemory(max_chars=4000, summary_chars=1500)
+    add_turns(memory, 2)
+    rendered = memory.render()
+    assert 'Summary of earlier conversation' not in rendered
+    assert '\nUser: Question 0? With some detail.\nBot: Answer 0.' in rendered
+
+
+def test_old_turns_are_folded_into_a_summary_within_the_budget():
+    memory = ConversationMemory(max_chars=500, summary_chars=1500)
+    add_turns(memory, 10)
+    verbatim = sum(len(memory._render_turn(turn)) for turn in memory.turns)
+    assert verbatim <= 500
+    assert memory.turns[-1]['user'] == 'Question 9? With some detail.'
+    assert memory.summary_points[0] == '- Asked: Question 0? Answered: Answer 0.'
+    assert len(memory.summary_points) + len(memory.turns) == 10
+    assert memory.render().startswith('Summary of earlier conversation:\n- Asked: Question 0?')
+
+
+def test_the_summary_drops_its_oldest_points_past_its_budget():
+    memory = ConversationMemory(max_chars=200, summary_chars=120)
+    add_turns(memory, 20)
+    assert sum(len(point) + 1 for point in memory.summary_points) <= 120
+    assert memory.summary_points[-1].startswith('- Asked: Question 18?')
+    assert [turn['user'] for turn in memory.turns] == ['Question 19? With some detail.']
+
+
+def test_the_latest_turn_is_kept_even_when_it_exceeds_the_budget():
+    memory = ConversationMemory(max_chars=50)
+    memory.add_turn('Short question?', 'A very long answer. ' * 20, speaker='Assistant')
+    assert len(memory.turns) == 1
+    assert '\nAssistant: A very long answer.' in memory.render()
+
+
+def test_compact_turn_keeps_one_sentence_each():
+    turn = {'user': 'What is **clause 4**? Please explain.', 'bot': 'x ' * 300, 'speaker': 'Bot'}
+    line = compact_turn(turn)
+    assert line.startswith('- Asked: What is clause 4? Answered: x x')
+    assert line.endswith('...')
+    assert len(line) < 260
+
+
+def test_memory_survives_pickling():
+    memory = ConversationMemory(max_chars=500)
+    add_turns(memory, 5)
+    restored = pickle.loads(pickle.dumps(memory))
+    assert restored.render() == memory.render()
+    restored.add_turn('Next?', 'Yes.')
+    assert restored.turns[-1]['bot'] == 'Yes.'
@@ -0,0 +1,49 @@
+from app import answer_tokens, split_reasoning
+
+ANALYSIS = "A long analysis line that definitely exceeds forty characters.\nIn short: pay."
+REPLY = ANALYSIS + "\nReasoning points:\n- Clause 4 requires payment\n2. Late fees accrue monthly\n"
+
+
+def test_split_reasoning_separates_the_points():
+    answer, reasoning = split_reasoning(REPLY)
+    assert answer == ANALYSIS
+    assert reasoning == ['Clause 4 requires payment', 'Late fees accrue monthly']
+
+
+def test_split_reasoning_accepts_a_markdown_heading():
+    answer, reasoning = split_reasoning("Pay the invoice.\n**Reasoning points:**\n* Clause 4")
+    assert answer == 'Pay the invoice.'
+    assert reasoning == ['Clause 4']
+
+
+def test_split_reasoning_accepts_json():
+    answer, reasoning = split_reasoning('{"answer": "Pay.", "reasoning": ["Clause 4"]}')
+    assert (answer, reasoning) == ('Pay.', ['Clause 4'])
+
+
+def test_split_reasoning_without_a_heading_keeps_the_whole_text():
+    assert split_reasoning(ANALYSIS) == (ANALYSIS, [])
+
+
+def test_split_reasoning_ignores_an_inline_heading():
+    text = "The reasoning points: below are not a heading.\n- Clause 4"
+    assert split_reasoning(text) == (text, [])
+
+
+def test_answer_tokens_stop_at_the_heading():
+    assert ''.join(answer_tokens([REPLY])) == ANALYSIS + '\n'
+
+
+def test_answer_tokens_find_a_heading_split_across_chunks():
+    chunks = [REPLY[i:i + 7] for i in range(0, len(REPLY), 7)]
+    assert ''.join(answer_tokens(chunks)) == ANALYSIS + '\n'
+
+
+def test_answer_tokens_without_a_heading_send_the_whole_text():
+    chunks = [ANALYSIS[i:i + 5] for i in range(0, len(ANALYSIS), 5)]
+    assert ''.join(answer_tokens(chunks)) == ANALYSIS
+
+
+def test_answer_tokens_send_an_inline_heading_as_text():
+    text = "Short.\nThe reasoning points: are inline"
+    assert ''.join(answer_tokens([text[:10], text[10:]])) == text
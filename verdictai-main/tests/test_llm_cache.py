@@ -0,0 +1,23 @@
+import time
+
+from llm_cache import SQLiteTier
+
+
+def test_expired_rows_are_purged_without_being_read(tmp_path):
+    tier = SQLiteTier(str(tmp_path / 'cache.sqlite3'), ttl=0.05)
+    tier.MAINTAIN_EVERY = 10
+    for i in range(5):
+        tier.set(f'old{i}', 'value')
+    time.sleep(0.1)
+    for i in range(5):
+        tier.set(f'new{i}', 'value')
+    assert tier._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] == 5
+
+
+def test_oldest_rows_are_evicted_past_the_size_cap(tmp_path):
+    tier = SQLiteTier(str(tmp_path / 'cache.sqlite3'), max_bytes=1000)
+    for i in range(20):
+        tier.set(f'key{i:02d}', 'v' * 95)
+    assert tier.enforce() == 10
+    assert tier.get('key00') is None
+    assert tier.get('key19') == 'v' * 95
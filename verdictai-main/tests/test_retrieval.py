@@ -0,0 +1,43 @@
+from retrieval import ChunkIndex, build_index, split_chunks
+
+FILLER = "The parties met on the stated date and exchanged the usual documents. "
+TEXT = (FILLER * 20 + "The tenant shall pay a security deposit of two months rent before moving in. "
+        + FILLER * 20 + "Either party may terminate this lease with ninety days written notice. "
+        + FILLER * 20)
+
+
+def test_chunks_cover_the_text_with_overlap_and_end_at_sentence_breaks():
+    chunks = split_chunks(TEXT, chunk_chars=400, overlap=80)
+    assert all(len(chunk) <= 400 for _, chunk in chunks)
+    assert all(chunk.endswith('.') for _, chunk in chunks)
+    assert chunks[0][0] == 0
+    for (start, chunk), (next_start, _) in zip(chunks, chunks[1:]):
+        assert start < next_start < start + len(chunk)
+    assert TEXT.rstrip().endswith(chunks[-1][1])
+
+
+def test_top_passages_pick_the_chunks_matching_the_query():
+    index = ChunkIndex(TEXT, chunk_chars=400, overlap=80)
+    passages = index.top_passages('security deposit', k=1)
+    assert len(passages) == 1
+    assert 'security deposit' in passages[0][1]
+
+
+def test_top_passages_are_in_document_order_within_the_budget():
+    index = ChunkIndex(TEXT, chunk_chars=400, overlap=80)
+    passages = index.top_passages('security deposit and terminate the lease', k=4, max_chars=1000)
+    assert [start for start, _ in passages] == sorted(start for start, _ in passages)
+    assert sum(len(chunk) for _, chunk in passages) <= 1000
+    context = index.context_for('security deposit and terminate the lease', max_chars=1000, k=4)
+    assert 'security deposit' in context and 'terminate' in context
+
+
+def test_unmatched_queries_fall_back_to_the_opening_chunks():
+    index = ChunkIndex(TEXT, chunk_chars=400, overlap=80)
+    assert index.top_passages('zebra', k=2) == index.chunks[:2]
+    assert index.top_passages('', k=1) == index.chunks[:1]
+
+
+def test_short_documents_are_not_indexed():
+    assert build_index('A one page letter.', max_chars=3000) is None
+    assert isinstance(build_index(TEXT, max_chars=3000), ChunkIndex)
@@ -0,0 +1,106 @@
+import os
+import time
+
+import pytest
+
+from session_store import BoundedStore, SQLiteStore, StoreBudget, create_store
+
+
+def test_least_recently_used_entries_are_evicted_across_stores_sharing_a_budget():
+    budget = StoreBudget(max_bytes=250)
+    evicted = []
+    documents = BoundedStore('documents', budget=budget, on_evict=lambda key, value: evicted.append(key))
+    drafts = BoundedStore('drafts', budget=budget)
+    documents['a'] = b'x' * 100
+    drafts['b'] = b'x' * 100
+    documents.get('a')
+    documents['c'] = b'x' * 100
+
+    assert 'b' not in drafts
+    assert documents['a'] == b'x' * 100 and 'c' in documents
+    assert drafts.stats()['evictions'] == 1
+    assert budget.used_bytes == 200
+    assert evicted == []
+
+
+def test_entries_expire_after_going_unread_for_their_ttl():
+    store = BoundedStore('documents', ttl=0.05)
+    store['idle'] = 'text'
+    store['read'] = 'text'
+    store.set('kept', 'text', ttl=60)
+    time.sleep(0.03)
+    store.get('read')
+    time.sleep(0.03)
+
+    assert store.purge_expired() == 1
+    assert 'idle' not in store
+    assert store.get('read') == 'text'
+    assert store.get('kept') == 'text'
+    assert store.stats()['expirations'] == 1
+
+
+def test_large_byte_values_are_spilled_to_disk_and_read_back():
+    budget = StoreBudget(max_bytes=1000)
+    removed = []
+    store = BoundedStore('pdfs', budget=budget, spill_bytes=10, on_evict=lambda key, value: removed.append(value))
+    store['small'] = b'tiny'
+    store['large'] = b'x' * 5000
+    path = store._entries['large'].spill_path
+
+    assert os.path.exists(path)
+    assert budget.used_bytes == 4
+    assert store.stats()['spilled_bytes'] == 5000
+    assert store['large'] == b'x' * 5000
+
+    del store['large']
+    assert not os.path.exists(path)
+    assert removed == [b'x' * 5000]
+
+
+def test_a_spilled_file_that_disappeared_is_a_miss():
+    store = BoundedStore('pdfs', spill_bytes=10)
+    store['large'] = b'x' * 100
+    os.remove(store._entries['large'].spill_path)
+
+    assert store.get('large') is None
+    assert 'large' not in store
+    assert store.stats()['misses'] == 1
+
+
+def test_sqlite_store_round_trips_values_between_instances(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+    writer = SQLiteStore('documents', ttl=60, path=path)
+    reader = SQLiteStore('documents', ttl=60, path=path)
+    other = SQLiteStore('drafts', path=path)
+    writer['doc'] = {'text': 'contract', 'pages': [1, 2]}
+
+    assert reader['doc'] == {'text': 'contract', 'pages': [1, 2]}
+    assert 'doc' in reader and 'doc' not in other
+    assert len(reader) == 1
+
+    del reader['doc']
+    assert writer.get('doc') is None
+    with pytest.raises(KeyError):
+        writer['doc']
+
+
+def test_sqlite_store_expires_and_evicts(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+    store = SQLiteStore('documents', ttl=60, path=path, max_bytes=250)
+    store.set('idle', 'text', ttl=0.01)
+    time.sleep(0.02)
+    assert store.get('idle') is None
+    assert store.stats()['expirations'] == 1
+
+    for key in ('a', 'b', 'c'):
+        store[key] = b'x' * 100
+        time.sleep(0.01)
+    store.enforce()
+    assert 'a' not in store and 'b' in store and 'c' in store
+    assert store.stats()['evictions'] == 1
+
+
+def test_create_store_picks_the_backend():
+    assert isinstance(create_store('documents', backend='memory'), BoundedStore)
+    with pytest.raises(ValueError):
+        create_store('documents', backend='redis')
@@ -0,0 +1,75 @@
+from summarization import map_reduce_summarize, split_sections
+
+
+def section(number, words):
+    return f"{number}. CLAUSE {number}\n" + ' '.join(f"term{number}" for _ in range(words))
+
+
+def test_small_sections_are_packed_and_headings_start_chunks():
+    text = '\n'.join(section(number, 10) for number in range(1, 7))
+    chunks = split_sections(text, max_chars=200)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert all(chunk.startswith(tuple(f"{number}. CLAUSE" for number in range(1, 7))) for chunk in chunks)
+    assert len(chunks) < 6
+    assert '\n'.join(chunks) == text
+
+
+def test_oversized_sections_are_split_at_paragraphs():
+    long_section = "ARTICLE 1\n" + '\n\n'.join('Paragraph text. ' * 5 for _ in range(6))
+    chunks = split_sections(long_section, max_chars=200)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 200 for chunk in chunks)
+
+
+def test_text_without_boundaries_is_cut_at_the_limit():
+    chunks = split_sections('x' * 450, max_chars=200)
+    assert [len(chunk) for chunk in chunks] == [200, 200, 50]
+
+
+def test_short_documents_are_summarized_in_one_call():
+    calls = []
+
+    def summarize_many(texts):
+        calls.append(texts)
+        return ['summary']
+
+    assert map_reduce_summarize('short text', summarize_many, None, max_chars=100) == 'summary'
+    assert calls == [['short text']]
+
+
+def test_partial_summaries_are_merged_in_groups_until_one_remains():
+    text = '\n'.join(section(number, 10) for number in range(1, 21))
+    merges = []
+
+    def summarize_many(texts):
+        return [f"s{index}" for index in range(len(texts))]
+
+    def merge_many(groups):
+        merges.append(groups)
+        return ['+'.join(group) for group in groups]
+
+    summary = map_reduce_summarize(text, summarize_many, merge_many, max_chars=100, fan_in=3)
+    assert all(len(group) <= 3 for groups in merges for group in groups)
+    assert len(merges) > 1
+    assert sorted(summary.replace('+', ' ').split()) == sorted(f"s{index}" for index in range(len(split_sections(text, 100))))
+
+
+def test_failed_chunks_are_skipped():
+    text = '\n'.join(section(number, 10) for number in range(1, 5))
+    summary = map_reduce_summarize(text, lambda texts: [None] * (len(texts) - 1) + ['last'],
+                                   lambda groups: ['+'.join(group) for group in groups], max_chars=100)
+    assert summary == 'last'
+    assert map_reduce_summarize(text, lambda texts: [None] * len(texts), None, max_chars=100) is None
+
+
+def test_summaries_too_long_to_group_are_still_merged_in_pairs():
+    text = '\n'.join(section(number, 10) for number in range(1, 5))
+    merges = []
+
+    def merge_many(groups):
+        merges.append(groups)
+        return ['m' * 90 for _ in groups]
+
+    summary = map_reduce_summarize(text, lambda texts: ['p' * 90 for _ in texts], merge_many, max_chars=100)
+    assert summary == 'm' * 90
+    assert all(len(group) == 2 for group in merges[0])
@@ -1,32 +1,652 @@
 import requests
 import json
 import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from llm_cache import create_default_cache, make_cache_key
+from metrics import observe_upstream
+from local_classifier import LOCAL_CLASSIFIER_THRESHOLD, load_default_classifier
+from summarization import map_reduce_summarize
 
 # Load environment variables
 load_dotenv()
 
 # WorqHat API configuration
 WORQHAT_API_KEY = os.getenv('WORQHAT_API_KEY', 'wh_m8ysgq9rVBiKq103lz3Cbcr2wa0VOBElUMurlpz')
+WORQHAT_BASE_URL = os.getenv('WORQHAT_BASE_URL', 'https://api.worqhat.com/api/ai/content/v4')
+
+# HTTP transport configuration
+WORQHAT_POOL_SIZE = int(os.getenv('WORQHAT_POOL_SIZE', '20'))
+WORQHAT_CONNECT_TIMEOUT = float(os.getenv('WORQHAT_CONNECT_TIMEOUT', '5'))
+WORQHAT_READ_TIMEOUT = float(os.getenv('WORQHAT_READ_TIMEOUT', '90'))
+WORQHAT_MAX_RETRIES = int(os.getenv('WORQHAT_MAX_RETRIES', '2'))
+WORQHAT_RETRY_BUDGET_RATIO = float(os.getenv('WORQHAT_RETRY_BUDGET_RATIO', '0.2'))
+
+# Share one upstream call between concurrent identical requests
+WORQHAT_COALESCE = os.getenv('WORQHAT_COALESCE', '1') not in ('0', 'false', 'False')
+
+# Admission control: request rate, adaptive concurrency limit and circuit breaker
+WORQHAT_RATE_LIMIT = float(os.getenv('WORQHAT_RATE_LIMIT', '20'))
+WORQHAT_RATE_BURST = float(os.getenv('WORQHAT_RATE_BURST', '40'))
+WORQHAT_MIN_CONCURRENCY = int(os.getenv('WORQHAT_MIN_CONCURRENCY', '2'))
+WORQHAT_MAX_CONCURRENCY = int(os.getenv('WORQHAT_MAX_CONCURRENCY', str(WORQHAT_POOL_SIZE)))
+WORQHAT_LATENCY_TARGET = float(os.getenv('WORQHAT_LATENCY_TARGET', '30'))
+WORQHAT_ADMISSION_TIMEOUT = float(os.getenv('WORQHAT_ADMISSION_TIMEOUT', '10'))
+WORQHAT_BREAKER_FAILURES = int(os.getenv('WORQHAT_BREAKER_FAILURES', '5'))
+WORQHAT_BREAKER_COOLDOWN = float(os.getenv('WORQHAT_BREAKER_COOLDOWN', '30'))
+
+# Upper bound on concurrent upstream calls made by the fan-out executor
+WORQHAT_MAX_PARALLEL = int(os.getenv('WORQHAT_MAX_PARALLEL', '8'))
+
+# Categories a legal document can be classified into
+DOCUMENT_CATEGORIES = [
+    'Legal Notice', 'Ownership Documents', 'Contracts & Agreements',
+    'Financial Documents', 'Terms & Conditions / Privacy Policies',
+    'Intellectual Property Documents', 'Criminal Offense Documents',
+    'Regulatory Compliance Documents', 'Employment Documents',
+    'Court Judgments & Legal Precedents'
+]
+
+# Status codes worth retrying: rate limiting and transient server errors. One of
+# these left once retries are exhausted means the upstream is unavailable.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CallTiming:
+    """Timing record for a single upstream call, including its retries"""
+
+    def __init__(self, operation, prompt_chars=None):
+        self.operation = operation
+        self.started_at = time.time()
+        self.attempts = 0
+        self.status_code = None
+        self.elapsed = 0.0
+        self.error = None
+        self.cached = False
+        self.coalesced = False
+        self.prompt_chars = prompt_chars
+        self.response_chars = None
+        self._start = time.perf_counter()
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self._start
+
+    def to_dict(self):
+        return {
+            'operation': self.operation,
+            'started_at': self.started_at,
+            'attempts': self.attempts,
+            'status_code': self.status_code,
+            'elapsed': self.elapsed,
+            'error': self.error,
+            'cached': self.cached,
+            'coalesced': self.coalesced,
+            'prompt_chars': self.prompt_chars,
+            'response_chars': self.response_chars
+        }
+
+
+class CachedResponse:
+    """Stand-in for a requests.Response whose content was served from the response cache"""
+
+    status_code = 200
+
+    def __init__(self, content):
+        self.text = content
+
+    def json(self):
+        return {'content': self.text}
+
+
+class RetryBudget:
+    """Caps retries to a fraction of recent requests so retries cannot amplify an outage
+
+    Every request deposits `ratio` tokens and every retry withdraws one token.
+    A small floor of `min_per_second` retries is always allowed so that a
+    quiet client can still retry an occasional failure.
+    """
+
+    def __init__(self, ratio=WORQHAT_RETRY_BUDGET_RATIO, min_per_second=1.0, max_tokens=20.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._last_refill) * self.min_per_second)
+        self._last_refill = now
+
+    def record_request(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of an answer when WorqHat is overloaded, failing or refusing admission
+
+    Endpoints map it to a 503 response with a Retry-After header.
+
+    Args:
+        message (str): What made the upstream unavailable
+        retry_after (float): Seconds after which a retry may succeed
+    """
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Limits the request rate to `rate` per second with bursts of up to `burst`; a rate of 0 disables it"""
+
+    def __init__(self, rate=WORQHAT_RATE_LIMIT, burst=WORQHAT_RATE_BURST):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        """Take one token, waiting up to `timeout` seconds for it
+
+        Returns:
+            bool: Whether a token was taken
+        """
+        if self.rate <= 0:
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return True
+                wait_for = (1.0 - self._tokens) / self.rate
+            if now + wait_for > deadline:
+                return False
+            time.sleep(wait_for)
+
+
+class AIMDLimiter:
+    """Concurrency limit that adapts to the upstream with additive increase, multiplicative decrease
+
+    Each fast, successful call raises the limit by 1/limit (about one slot
+    per limit's worth of calls). A call that is slower than
+    `latency_target` or that reports overload cuts the limit by `backoff`,
+    at most once per second so one burst of failures counts once.
+    """
+
+    def __init__(self, min_limit=WORQHAT_MIN_CONCURRENCY, max_limit=WORQHAT_MAX_CONCURRENCY,
+                 latency_target=WORQHAT_LATENCY_TARGET, backoff=0.7):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout):
+        """Take a concurrency slot, waiting up to `timeout` seconds for one
+
+        Returns:
+            bool: Whether a slot was taken
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency=None, overloaded=False):
+        """Return a slot and adjust the limit from the call's latency and outcome"""
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if overloaded or (latency is not None and latency > self.latency_target):
+                if now - self._last_decrease >= 1.0:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """Fails fast after consecutive upstream failures, probing again after a cooldown
+
+    Closed: calls pass and failures are counted. After `failure_threshold`
+    consecutive failures it opens and rejects calls for `cooldown` seconds,
+    then lets a single probe through (half-open); the probe's outcome
+    closes or re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=WORQHAT_BREAKER_FAILURES, cooldown=WORQHAT_BREAKER_COOLDOWN):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _retry_after(self):
+        return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def check(self):
+        """Raise UpstreamUnavailable while the circuit is open, without taking the half-open probe"""
+        with self._lock:
+            if self.state == self.OPEN and self._retry_after() > 0:
+                raise UpstreamUnavailable('WorqHat is failing; requests are paused', self._retry_after())
+
+    def before_call(self):
+        """Admit a call or raise UpstreamUnavailable
+
+        Returns:
+            bool: Whether this call is the half-open probe
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                retry_after = self._retry_after()
+                if retry_after > 0:
+                    raise UpstreamUnavailable('WorqHat is failing; requests are paused', retry_after)
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise UpstreamUnavailable('WorqHat is recovering; a probe request is in flight', 1.0)
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def cancel_probe(self):
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class AdmissionController:
+    """Decides whether an upstream request may be sent now
+
+    A request must pass the circuit breaker, take a rate token and take a
+    slot under the adaptive concurrency limit, waiting at most `timeout`
+    seconds in total; otherwise UpstreamUnavailable is raised so the caller
+    fails fast instead of queueing behind a degraded upstream.
+    """
+
+    def __init__(self, bucket=None, limiter=None, breaker=None, timeout=WORQHAT_ADMISSION_TIMEOUT):
+        self.bucket = bucket or TokenBucket()
+        self.limiter = limiter or AIMDLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats = {'admitted': 0, 'rejected_breaker': 0, 'rejected_rate': 0, 'rejected_concurrency': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def check(self):
+        """Fail fast if the circuit is open, e.g. before starting a streamed response"""
+        try:
+            self.breaker.check()
+        except UpstreamUnavailable:
+            self._count('rejected_breaker')
+            raise
+
+    def acquire(self):
+        """Admit one upstream request; pair every successful call with release()
+
+        Raises:
+            UpstreamUnavailable: If the circuit is open or no rate token or concurrency slot frees up in time
+        """
+        self.check()
+        deadline = time.monotonic() + self.timeout
+        if not self.bucket.acquire(self.timeout):
+            self._count('rejected_rate')
+            raise UpstreamUnavailable('WorqHat request rate limit reached', 1.0 / max(self.bucket.rate, 1e-6))
+        if not self.limiter.acquire(max(0.0, deadline - time.monotonic())):
+            self._count('rejected_concurrency')
+            raise UpstreamUnavailable('Too many WorqHat requests in flight', 1.0)
+        try:
+            self.breaker.before_call()
+        except UpstreamUnavailable:
+            self.limiter.release()
+            self._count('rejected_breaker')
+            raise
+        self._count('admitted')
+
+    def release(self, latency=None, failed=False, overloaded=False):
+        """Report the outcome of an admitted request
+
+        Args:
+            latency (float): Seconds until the response arrived, or None if there was none
+            failed (bool): Whether the upstream failed (connection error, timeout or 5xx)
+            overloaded (bool): Whether the upstream signalled overload (429, 503 or a timeout)
+        """
+        self.limiter.release(latency, overloaded)
+        if failed or overloaded:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'concurrency_limit': round(self.limiter.limit, 2),
+            'in_flight': self.limiter.in_flight,
+            'breaker_state': self.breaker.state,
+            'consecutive_failures': self.breaker.consecutive_failures,
+        })
+        return stats
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into a single execution
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for it and receive the same result, or the same
+    exception. Nothing is kept once the call finishes.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'coalesced': 0}
+
+    def do(self, key, func):
+        """Run func() once for all concurrent callers with the same key
+
+        Returns:
+            tuple: The result and whether it was shared from another caller's call
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats['leaders'] += 1
+            else:
+                flight.waiters += 1
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = func()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._flights))
+
 
 class WorqHatClient:
     """Client for interacting with WorqHat AI APIs"""
     
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, base_url=None, pool_size=None, connect_timeout=None,
+                 read_timeout=None, max_retries=None, backoff_base=0.5, backoff_cap=8.0, cache=None,
+                 coalesce=None, admission=None):
         self.api_key = api_key or WORQHAT_API_KEY
-        self.base_url = "https://api.worqhat.com/api/ai/content/v4"
+        self.base_url = base_url or WORQHAT_BASE_URL
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else WORQHAT_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else WORQHAT_READ_TIMEOUT
+        )
+        self.max_retries = max_retries if max_retries is not None else WORQHAT_MAX_RETRIES
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_budget = RetryBudget()
+
+        # Every upstream attempt is admitted here, so a degraded upstream sheds load instead of piling it up
+        self.admission = admission or AdmissionController()
+
+        # One pooled keep-alive session shared by every call made through this client
+        pool_size = pool_size or WORQHAT_POOL_SIZE
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Callables invoked with a CallTiming after every upstream call
+        self.timing_listeners = []
+        self._local = threading.local()
+
+        # Content-addressed response cache shared by every client method
+        self.cache = cache if cache is not None else create_default_cache()
+
+        # Identical requests already in flight are shared rather than sent again
+        self.coalesce = WORQHAT_COALESCE if coalesce is None else coalesce
+        self.single_flight = SingleFlight()
+
+    @property
+    def last_timing(self):
+        """CallTiming of the most recent upstream call made from the current thread"""
+        return getattr(self._local, 'last_timing', None)
+
+    def cache_stats(self):
+        """Hit/miss counters of the response cache, or None when caching is disabled"""
+        return self.cache.stats() if self.cache is not None else None
+
+    def _backoff_delay(self, attempt, response=None):
+        """Full-jitter exponential backoff, honouring Retry-After when the upstream sends one"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_cap)
+                except ValueError:
+                    pass
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def _post(self, payload, operation, stream=False):
+        """POST a payload to the content endpoint over the pooled session
+
+        Retries connection failures and retryable status codes with jittered
+        backoff, within both the per-call retry limit and the client-wide
+        retry budget. Every attempt must first pass the admission controller.
+        The timing of the call is stored in `last_timing` and
+        passed to every registered timing listener. For a successful stream
+        the timing is attached to the response as `response.timing` and is
+        recorded by the consumer once the body has been read.
+
+        Args:
+            payload (dict): The JSON request body
+            operation (str): Name of the client operation, used for timing
+            stream (bool): Whether to stream the response body
+
+        Returns:
+            requests.Response: The final response received from the upstream
+
+        Raises:
+            UpstreamUnavailable: If admission is refused, the upstream cannot be reached,
+                or it still answers 429 or a 5xx status once retries are exhausted
+        """
+        timing = CallTiming(operation, len(payload.get('question', '')))
+        deferred = False
+        self.retry_budget.record_request()
+        try:
+            attempt = 0
+            while True:
+                self.admission.acquire()
+                timing.attempts += 1
+                sent_at = time.perf_counter()
+                try:
+                    response = self.session.post(self.base_url, json=payload, timeout=self.timeout, stream=stream)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    timed_out = isinstance(e, requests.Timeout)
+                    self.admission.release(failed=True, overloaded=timed_out)
+                    # Read timeouts are not retried: the upstream may still be working on the request
+                    if (isinstance(e, requests.ReadTimeout) or attempt >= self.max_retries
+                            or not self.retry_budget.try_spend()):
+                        raise UpstreamUnavailable(f"WorqHat is unreachable: {e}", self._backoff_delay(attempt)) from e
+                    time.sleep(self._backoff_delay(attempt))
+                    attempt += 1
+                    continue
+                except Exception:
+                    # E.g. a truncated chunked body; the slot (and a half-open probe) must still be given back
+                    self.admission.release(failed=True)
+                    raise
+
+                status = response.status_code
+                self.admission.release(time.perf_counter() - sent_at, failed=status >= 500,
+                                       overloaded=status in (429, 503))
+                timing.status_code = status
+                if (status in RETRYABLE_STATUS_CODES
+                        and attempt < self.max_retries and self.retry_budget.try_spend()):
+                    delay = self._backoff_delay(attempt, response)
+                    response.close()
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                if status in RETRYABLE_STATUS_CODES:
+                    retry_after = self._backoff_delay(attempt, response)
+                    response.close()
+                    raise UpstreamUnavailable(f"WorqHat returned {status}", retry_after)
+                if stream and status == 200:
+                    response.timing = timing
+                    deferred = True
+                elif not stream:
+                    timing.response_chars = _content_chars(response)
+                return response
+        except Exception as e:
+            timing.error = str(e)
+            raise
+        finally:
+            if not deferred:
+                timing.finish()
+                self._record_timing(timing)
+
+    def _record_timing(self, timing):
+        self._local.last_timing = timing
+        for listener in self.timing_listeners:
+            try:
+                listener(timing)
+            except Exception:
+                pass
+
+    def _send(self, payload, operation, use_cache=True):
+        """Serve a payload from the response cache, falling back to the upstream on a miss
+
+        Successful upstream responses are stored in the cache; errors never are.
+        Concurrent identical payloads share one upstream call, whether or not
+        the cache is used.
+
+        Args:
+            payload (dict): The JSON request body
+            operation (str): Name of the client operation, used for timing
+            use_cache (bool): Set to False to bypass the cache for this call
+
+        Returns:
+            requests.Response or CachedResponse: The response to the payload
+        """
+        key = make_cache_key(payload) if (use_cache and self.cache is not None) or self.coalesce else None
+        cache_key = key if use_cache and self.cache is not None else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                timing = CallTiming(operation, len(payload['question']))
+                timing.cached = True
+                timing.status_code = 200
+                timing.response_chars = len(cached)
+                timing.finish()
+                self._record_timing(timing)
+                return CachedResponse(cached)
+
+        if not self.coalesce:
+            return self._fetch(payload, operation, cache_key)
+
+        timing = CallTiming(operation, len(payload['question']))
+        response, shared = self.single_flight.do(key, lambda: self._fetch(payload, operation, cache_key))
+        if shared:
+            timing.coalesced = True
+            timing.status_code = response.status_code
+            timing.response_chars = _content_chars(response)
+            timing.finish()
+            self._record_timing(timing)
+        return response
+
+    def _fetch(self, payload, operation, cache_key=None):
+        """POST a payload to the upstream and store a successful answer under cache_key"""
+        response = self._post(payload, operation)
+        if cache_key is not None and response.status_code == 200:
+            try:
+                content = response.json().get('content')
+            except ValueError:
+                content = None
+            if isinstance(content, str):
+                self.cache.set(cache_key, content)
+        return response
     
-    def generate_text(self, prompt, context="", max_tokens=1000):
+    def generate_text(self, prompt, context="", max_tokens=1000, use_cache=True):
         """Generate text using WorqHat's AI models
         
         Args:
             prompt (str): The user's query or instruction
             context (str): Additional context for the AI to consider
             max_tokens (int): Maximum number of tokens to generate
+            use_cache (bool): Set to False to bypass the response cache
             
         Returns:
             str: The generated text response
@@ -43,12 +663,8 @@ class WorqHatClient:
                 "stream_data": False
             }
             
-            # Make the API request to WorqHat's Content Generation API
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=payload
-            )
+            # Make the API request over the pooled session
+            response = self._send(payload, 'generate_text', use_cache)
             
             # Check if the request was successful
             if response.status_code == 200:
@@ -57,15 +673,90 @@ class WorqHatClient:
             else:
                 return f"Error: {response.status_code} - {response.text}"
                 
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             return f"Error generating text: {str(e)}"
     
-    def summarize_text(self, text, max_tokens=500):
+    def generate_text_stream(self, prompt, context="", use_cache=True):
+        """Generate text using WorqHat's AI models, yielding chunks as they arrive
+        
+        A cached answer is yielded as a single chunk. A fully streamed answer
+        is stored in the cache under the same key as generate_text uses.
+        
+        Args:
+            prompt (str): The user's query or instruction
+            context (str): Additional context for the AI to consider
+            use_cache (bool): Set to False to bypass the response cache
+            
+        Yields:
+            str: Successive pieces of the generated text response
+        """
+        full_prompt = f"{context}\n\n{prompt}" if context else prompt
+        payload = {
+            "question": full_prompt,
+            "model": "aicon-v4-large-160824",
+            "randomness": 0.2,
+            "stream_data": True
+        }
+
+        key = make_cache_key(payload) if use_cache and self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                timing = CallTiming('generate_text_stream', len(full_prompt))
+                timing.cached = True
+                timing.status_code = 200
+                timing.response_chars = len(cached)
+                timing.finish()
+                self._record_timing(timing)
+                yield cached
+                return
+
+        try:
+            response = self._post(payload, 'generate_text_stream', stream=True)
+        except UpstreamUnavailable:
+            raise
+        except Exception as e:
+            yield f"Error generating text: {str(e)}"
+            return
+
+        chunks = []
+        timing = getattr(response, 'timing', None)
+        try:
+            with response:
+                if response.status_code != 200:
+                    yield f"Error: {response.status_code} - {response.text}"
+                    return
+
+                response.encoding = response.encoding or 'utf-8'
+                try:
+                    for line in response.iter_lines(decode_unicode=True):
+                        chunk = _parse_stream_line(line)
+                        if chunk:
+                            chunks.append(chunk)
+                            yield chunk
+                except Exception as e:
+                    timing.error = str(e)
+                    yield f"\n\nError while streaming: {str(e)}"
+                    return
+        finally:
+            # A stream's timing covers the whole body, recorded when it ends or the consumer stops reading
+            if timing is not None:
+                timing.response_chars = sum(len(chunk) for chunk in chunks)
+                timing.finish()
+                self._record_timing(timing)
+
+        if key is not None and chunks:
+            self.cache.set(key, ''.join(chunks))
+
+    def summarize_text(self, text, max_tokens=500, use_cache=True):
         """Summarize text using WorqHat's AI models
         
         Args:
             text (str): The text to summarize
             max_tokens (int): Maximum number of tokens in the summary
+            use_cache (bool): Set to False to bypass the response cache
             
         Returns:
             str: The generated summary
@@ -79,12 +770,8 @@ class WorqHatClient:
                 "stream_data": False
             }
             
-            # Make the API request to WorqHat's Content Generation API
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=payload
-            )
+            # Make the API request over the pooled session
+            response = self._send(payload, 'summarize_text', use_cache)
             
             # Check if the request was successful
             if response.status_code == 200:
@@ -93,14 +780,17 @@ class WorqHatClient:
             else:
                 return f"Error: {response.status_code} - {response.text}"
                 
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             return f"Error generating summary: {str(e)}"
     
-    def classify_document(self, text):
+    def classify_document(self, text, use_cache=True):
         """Classify a legal document using WorqHat's AI models
         
         Args:
             text (str): The document text to classify
+            use_cache (bool): Set to False to bypass the response cache
             
         Returns:
             str: The document category
@@ -114,12 +804,8 @@ class WorqHatClient:
                 "stream_data": False
             }
             
-            # Make the API request
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=payload
-            )
+            # Make the API request over the pooled session
+            response = self._send(payload, 'classify_document', use_cache)
             
             # Check if the request was successful
             if response.status_code == 200:
@@ -127,13 +813,7 @@ class WorqHatClient:
                 category = result.get('content', '').strip()
                 
                 # Ensure the category is one of the predefined categories
-                valid_categories = [
-                    'Legal Notice', 'Ownership Documents', 'Contracts & Agreements',
-                    'Financial Documents', 'Terms & Conditions / Privacy Policies',
-                    'Intellectual Property Documents', 'Criminal Offense Documents',
-                    'Regulatory Compliance Documents', 'Employment Documents',
-                    'Court Judgments & Legal Precedents'
-                ]
+                valid_categories = DOCUMENT_CATEGORIES
                 
                 # Return the category if valid, otherwise a default
                 if any(valid_cat in category for valid_cat in valid_categories):
@@ -147,14 +827,17 @@ class WorqHatClient:
             else:
                 return "Contracts & Agreements"  # Default category on error
                 
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             return "Contracts & Agreements"  # Default category on exception
     
-    def extract_key_phrases(self, text):
+    def extract_key_phrases(self, text, use_cache=True):
         """Extract key phrases from a legal document
         
         Args:
             text (str): The document text to analyze
+            use_cache (bool): Set to False to bypass the response cache
             
         Returns:
             list: List of key phrases
@@ -168,12 +851,8 @@ class WorqHatClient:
                 "stream_data": False
             }
             
-            # Make the API request
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=payload
-            )
+            # Make the API request over the pooled session
+            response = self._send(payload, 'extract_key_phrases', use_cache)
             
             # Check if the request was successful
             if response.status_code == 200:
@@ -186,11 +865,123 @@ class WorqHatClient:
             else:
                 return ["Error extracting key phrases"]
                 
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             return [f"Error: {str(e)}"]
 
+
+def _content_chars(response):
+    """Length of the generated content in a JSON response, or None if it has none"""
+    try:
+        content = response.json().get('content')
+    except (ValueError, AttributeError):
+        return None
+    return len(content) if isinstance(content, str) else None
+
+
+def _parse_stream_line(line):
+    """Pull the text content out of one line of a streamed response
+    
+    Lines may be bare JSON objects or Server-Sent Events "data:" lines
+    wrapping them; anything that is not JSON is treated as raw text.
+    """
+    if not line:
+        return ''
+    if line.startswith('data:'):
+        line = line[len('data:'):].strip()
+        if line == '[DONE]':
+            return ''
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return line
+    if isinstance(data, dict):
+        return data.get('content') or ''
+    return ''
+
+
+class CallResult:
+    """Outcome of one call made through run_concurrently"""
+
+    def __init__(self, value=None, error=None):
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+# One pool per nesting level, so a fan-out started from inside a fanned-out
+# call (e.g. map-reduce summarization within /process) cannot deadlock by
+# waiting on tasks queued behind itself in the same pool
+_FANOUT_MAX_DEPTH = 2
+_executors = {}
+_executor_lock = threading.Lock()
+_fanout_state = threading.local()
+
+
+def _get_executor(depth=0):
+    with _executor_lock:
+        if depth not in _executors:
+            _executors[depth] = ThreadPoolExecutor(max_workers=WORQHAT_MAX_PARALLEL,
+                                                   thread_name_prefix=f'worqhat-fanout-{depth}')
+        return _executors[depth]
+
+
+def _fanout_depth():
+    return getattr(_fanout_state, 'depth', 0)
+
+
+def run_concurrently(calls, max_parallel=None):
+    """Run independent zero-argument callables concurrently with bounded parallelism
+    
+    Calls share a process-wide thread pool, so at most WORQHAT_MAX_PARALLEL
+    of them are in flight per nesting level. A fan-out started from inside a
+    fanned-out call uses the next level's pool; beyond two levels calls run
+    inline.
+    
+    Args:
+        calls (list): Zero-argument callables to run
+        max_parallel (int): Maximum number of these calls in flight at once
+        
+    Returns:
+        list: One CallResult per call, in the same order as the calls
+    """
+    calls = list(calls)
+    results = [None] * len(calls)
+    depth = _fanout_depth()
+
+    def run(index):
+        _fanout_state.depth = depth + 1
+        try:
+            results[index] = CallResult(value=calls[index]())
+        except Exception as e:
+            results[index] = CallResult(error=e)
+
+    if len(calls) <= 1 or depth >= _FANOUT_MAX_DEPTH:
+        for index in range(len(calls)):
+            try:
+                results[index] = CallResult(value=calls[index]())
+            except Exception as e:
+                results[index] = CallResult(error=e)
+        return results
+
+    # Keep at most max_parallel calls submitted, starting the next as each one finishes
+    limit = max(1, max_parallel or WORQHAT_MAX_PARALLEL)
+    executor = _get_executor(depth)
+    pending = set()
+    for index in range(len(calls)):
+        if len(pending) >= limit:
+            _, pending = wait(pending, return_when=FIRST_COMPLETED)
+        pending.add(executor.submit(run, index))
+    wait(pending)
+    return results
+
 # Create a global instance for use throughout the application
 worqhat_client = WorqHatClient()
+worqhat_client.timing_listeners.append(observe_upstream)
 
 # Functions that mirror the existing multiagent interface
 
@@ -227,12 +1018,93 @@ def summarize_document(text):
     Returns:
         str: Document summary
     """
-    return worqhat_client.summarize_text(text)
+    return summarize_long_text(text)
+
+def is_error_response(text):
+    """Whether a client method returned one of its error strings instead of content"""
+    return isinstance(text, str) and text.startswith(("Error: ", "Error generating", "Error extracting"))
+
+def parse_json_object(text):
+    """Parse the first JSON object in a model response
+
+    Models often wrap JSON in code fences or add a sentence before or after
+    it, so every '{' is tried as the start of an object until one decodes.
+
+    Args:
+        text (str): The generated text
+
+    Returns:
+        dict: The parsed object, or None if the text holds no JSON object
+    """
+    if not isinstance(text, str):
+        return None
+    decoder = json.JSONDecoder()
+    start = text.find('{')
+    while start != -1:
+        try:
+            value, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            value = None
+        if isinstance(value, dict):
+            return value
+        start = text.find('{', start + 1)
+    return None
+
+def raise_if_unavailable(results):
+    """Re-raise the first UpstreamUnavailable among CallResults, so fan-outs fail fast as a whole"""
+    for result in results:
+        if isinstance(result.error, UpstreamUnavailable):
+            raise result.error
+
+
+def _values_or_none(results):
+    raise_if_unavailable(results)
+    return [result.value if result.ok and not is_error_response(result.value) else None for result in results]
+
+def summarize_long_text(text):
+    """Summarize a document of any length with concurrent map-reduce over its sections
+    
+    Short documents take a single summarize_text call. Long ones are split
+    into section-aware chunks that are summarized concurrently, and the
+    partial summaries are merged in as few passes as the fan-in allows.
+    
+    Args:
+        text (str): The document text to summarize
+        
+    Returns:
+        str: Document summary
+    """
+    def summarize_many(chunks):
+        if len(chunks) == 1:
+            return [worqhat_client.summarize_text(chunks[0])]
+        prompts = [lambda chunk=chunk: worqhat_client.summarize_text(
+            f"(Part {i + 1} of {len(chunks)} of a longer legal document)\n\n{chunk}")
+            for i, chunk in enumerate(chunks)]
+        return _values_or_none(run_concurrently(prompts))
+
+    def merge_many(groups):
+        prompts = [lambda group=group: worqhat_client.generate_text(
+            "Combine these partial summaries of consecutive parts of one legal document into a single "
+            "coherent summary. Keep every obligation, deadline, amount and party mentioned.\n\n"
+            + "\n\n".join(f"Part {i + 1}:\n{summary}" for i, summary in enumerate(group)))
+            for group in groups]
+        return _values_or_none(run_concurrently(prompts))
+
+    summary = map_reduce_summarize(text, summarize_many, merge_many)
+    return summary if summary is not None else "Error generating summary: every part of the document failed"
 
 # Create replacement functions for the existing NLP utilities
 
 class DocumentClassifier:
-    """Classifier for legal documents using WorqHat AI"""
+    """Classifier for legal documents using a local model, falling back to WorqHat AI
+    
+    The local model answers when its confidence reaches the threshold; the
+    LLM is only called for uncertain documents or when no model is trained.
+    """
+    
+    def __init__(self, local_model=None, threshold=None):
+        self.local_model = local_model if local_model is not None else load_default_classifier()
+        self.threshold = threshold if threshold is not None else LOCAL_CLASSIFIER_THRESHOLD
     
     def classify(self, text):
         """Classify a legal document
@@ -243,7 +1115,32 @@ class DocumentClassifier:
         Returns:
             str: The document category
         """
-        return worqhat_client.classify_document(text)
+        return self.classify_with_confidence(text)[0]
+    
+    def classify_with_confidence(self, text):
+        """Classify a legal document and report how the answer was reached
+        
+        Args:
+            text (str): The document text to classify
+            
+        Returns:
+            tuple: The document category, the local model's confidence (or None), and 'local' or 'llm'
+        """
+        category, confidence = None, None
+        if self.local_model is not None:
+            try:
+                category, confidence = self.local_model.predict(text)
+                if confidence >= self.threshold:
+                    return category, confidence, 'local'
+            except Exception:
+                category, confidence = None, None
+        try:
+            return worqhat_client.classify_document(text), confidence, 'llm'
+        except UpstreamUnavailable:
+            # Better an uncertain local answer than none while the upstream is unavailable
+            if category is None:
+                raise
+            return category, confidence, 'local'
 
 class DocumentProcessor:
     """Processor for legal documents using WorqHat AI"""
@@ -257,7 +1154,7 @@ class DocumentProcessor:
         Returns:
             str: Document summary
         """
-        return worqhat_client.summarize_text(text)
+        return summarize_long_text(text)
     
     def extract_key_phrases(self, text):
         """Extract key phrases from a legal document